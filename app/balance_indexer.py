@@ -0,0 +1,284 @@
+import asyncio
+import datetime as dt
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from . import models
+from .blockchain_service import blockchain_service, is_evm_address
+from .config import settings
+from .db import SessionLocal
+from .ton_service import ton_service
+
+logger = logging.getLogger("slh_wallet.balance_indexer")
+
+
+class BalanceIndexer:
+    """Refreshes ``wallet_balance_snapshots`` for every registered wallet.
+
+    Wallets are walked in telegram_id order, ``chunk_size`` at a time. For
+    each chunk, BNB/SLH come from one JSON-RPC batch refresh and TON balances
+    from ``TonService.get_slh_ton_balances_many``. The snapshots and the
+    new cursor are written in one transaction, so after a crash the next run
+    resumes at the first chunk that was not stored.
+
+    Every web worker runs an indexer, but only one does the work: a chunk is
+    claimed by taking a lease on the checkpoint row *before* any network
+    I/O, and the other workers skip their run while the lease is live. The
+    lease is a pair of columns rather than a session advisory lock, so it
+    works through PgBouncer and no transaction stays open across the fetch;
+    a worker that dies simply lets it expire.
+    """
+
+    name = "balances"
+
+    def __init__(self, chunk_size: int, interval: float, lease: float) -> None:
+        self.chunk_size = max(1, chunk_size)
+        self.interval = interval
+        self.lease = dt.timedelta(seconds=lease)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self.cursor = ""
+        self.pass_started_at: Optional[dt.datetime] = None
+        self.last_pass_started_at: Optional[dt.datetime] = None
+        self.last_pass_completed_at: Optional[dt.datetime] = None
+        self.pass_wallets = 0
+        self.chunks = 0
+        self.wallets = 0
+        self.errors = 0
+        self.conflicts = 0
+        self.skipped = 0
+
+    async def _checkpoint(self, db, for_update: bool = False) -> models.IndexerCheckpoint:
+        stmt = select(models.IndexerCheckpoint).where(models.IndexerCheckpoint.name == self.name)
+        if for_update:
+            stmt = stmt.with_for_update()
+        checkpoint = (await db.scalars(stmt)).one_or_none()
+        if checkpoint is None:
+            await db.execute(
+                pg_insert(models.IndexerCheckpoint)
+                .values(name=self.name, cursor="")
+                .on_conflict_do_nothing()
+            )
+            checkpoint = (await db.scalars(stmt)).one()
+        return checkpoint
+
+    async def _fetch(self, wallets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        evm = {w["bnb_address"] for w in wallets if is_evm_address(w["bnb_address"])}
+        evm |= {w["slh_address"] for w in wallets if is_evm_address(w["slh_address"])}
+        block_number, onchain, ton = await asyncio.gather(
+            blockchain_service.get_block_number(),
+            blockchain_service.get_balances_many(evm),
+            ton_service.get_slh_ton_balances_many(w["ton_address"] for w in wallets),
+            return_exceptions=True,
+        )
+        for result in (onchain, ton):
+            if isinstance(result, Exception):
+                raise result
+        if isinstance(block_number, Exception):
+            # Balances were read at "latest" anyway; only the label is missing.
+            logger.warning("eth_blockNumber failed: %s", block_number)
+            block_number = None
+
+        snapshots = []
+        for wallet in wallets:
+            bnb = onchain.get(wallet["bnb_address"]) or {}
+            slh = onchain.get(wallet["slh_address"]) or {}
+            ton_result = ton.get(wallet["ton_address"]) or {}
+            errors = [e for e in (bnb.get("error"), slh.get("error")) if e]
+            if ton_result.get("error"):
+                errors.append(f"ton: {ton_result['error']}")
+            snapshots.append(
+                {
+                    "telegram_id": wallet["telegram_id"],
+                    "bnb_balance": bnb.get("bnb"),
+                    "slh_balance": slh.get("slh"),
+                    "slh_ton_balance": ton_result.get("slh_ton"),
+                    "block_number": block_number,
+                    "error": "; ".join(errors)[:512] or None,
+                }
+            )
+        return snapshots
+
+    async def _claim(self, db) -> Optional[str]:
+        """Take or extend the lease; returns the cursor, or None if another worker holds it."""
+        await self._checkpoint(db)
+        checkpoint = models.IndexerCheckpoint
+        return (
+            await db.execute(
+                update(checkpoint)
+                .where(
+                    checkpoint.name == self.name,
+                    or_(
+                        checkpoint.lease_until.is_(None),
+                        checkpoint.lease_until < func.now(),
+                        checkpoint.lease_owner == self.owner,
+                    ),
+                )
+                .values(lease_owner=self.owner, lease_until=func.now() + self.lease)
+                .returning(checkpoint.cursor)
+            )
+        ).scalar_one_or_none()
+
+    async def index_chunk(self) -> int:
+        """Index the next chunk; returns how many wallets it covered.
+
+        0 means the pass is done, or another worker holds the lease.
+        """
+        wallet = models.Wallet
+        async with SessionLocal() as db:
+            cursor = await self._claim(db)
+            if cursor is None:
+                await db.commit()
+                self.skipped += 1
+                return 0
+            rows = (
+                await db.execute(
+                    select(
+                        wallet.telegram_id,
+                        wallet.bnb_address,
+                        wallet.slh_address,
+                        wallet.ton_address,
+                        wallet.slh_ton_address,
+                    )
+                    .where(wallet.telegram_id > cursor)
+                    .order_by(wallet.telegram_id)
+                    .limit(self.chunk_size)
+                )
+            ).all()
+            await db.commit()
+
+        wallets = [
+            {
+                "telegram_id": row.telegram_id,
+                "bnb_address": row.bnb_address,
+                # SLH lives on the BNB address unless a separate one was registered.
+                "slh_address": row.slh_address or row.bnb_address,
+                "ton_address": row.slh_ton_address or row.ton_address,
+            }
+            for row in rows
+        ]
+        now = dt.datetime.now(dt.timezone.utc)
+        snapshots = await self._fetch(wallets) if wallets else []
+
+        async with SessionLocal() as db:
+            checkpoint = await self._checkpoint(db, for_update=True)
+            if checkpoint.lease_owner != self.owner or checkpoint.cursor != cursor:
+                # The lease expired mid-fetch and another worker took over.
+                self.conflicts += 1
+                return 0
+
+            if not wallets:
+                # End of the table: the pass is complete, start over next time.
+                checkpoint.last_pass_started_at = checkpoint.pass_started_at
+                checkpoint.last_pass_completed_at = now
+                checkpoint.pass_started_at = None
+                checkpoint.passes += 1
+                checkpoint.cursor = ""
+                # Let whichever worker wakes first run the next pass.
+                checkpoint.lease_owner = None
+                checkpoint.lease_until = None
+            else:
+                if not cursor:
+                    checkpoint.pass_started_at = now
+                snapshot = models.WalletBalanceSnapshot
+                stmt = pg_insert(snapshot).values(snapshots)
+
+                def kept(column: str):
+                    # A failed fetch records its error but keeps the last good value.
+                    fresh = stmt.excluded[column]
+                    return case(
+                        (stmt.excluded.error.is_(None), fresh),
+                        else_=func.coalesce(fresh, getattr(snapshot, column)),
+                    )
+
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[snapshot.telegram_id],
+                        set_={
+                            "bnb_balance": kept("bnb_balance"),
+                            "slh_balance": kept("slh_balance"),
+                            "slh_ton_balance": kept("slh_ton_balance"),
+                            "block_number": kept("block_number"),
+                            "error": stmt.excluded.error,
+                            "fetched_at": now,
+                        },
+                    )
+                )
+                checkpoint.cursor = wallets[-1]["telegram_id"]
+            await db.commit()
+
+        self.cursor = checkpoint.cursor
+        self.pass_started_at = checkpoint.pass_started_at
+        self.last_pass_started_at = checkpoint.last_pass_started_at
+        self.last_pass_completed_at = checkpoint.last_pass_completed_at
+        if wallets:
+            self.chunks += 1
+            self.wallets += len(wallets)
+            self.pass_wallets = self.pass_wallets + len(wallets) if cursor else len(wallets)
+            self.errors += sum(1 for s in snapshots if s["error"])
+        return len(wallets)
+
+    async def run_pass(self) -> None:
+        """Index chunks until the end of the wallets table."""
+        while not (self._stopping and self._stopping.is_set()):
+            skipped, conflicts = self.skipped, self.conflicts
+            if not await self.index_chunk():
+                if (skipped, conflicts) == (self.skipped, self.conflicts):
+                    logger.info("Balance indexer pass complete (%d wallets)", self.pass_wallets)
+                return
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="balance-indexer")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.run_pass()
+            except Exception:  # noqa: BLE001
+                logger.exception("Balance indexer failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = dt.datetime.now(dt.timezone.utc)
+        # Every snapshot is at most this old: the last full pass started then.
+        lag = (now - self.last_pass_started_at).total_seconds() if self.last_pass_started_at else None
+        return {
+            "cursor": self.cursor,
+            "pass_wallets": self.pass_wallets,
+            "pass_started_at": self.pass_started_at.isoformat() if self.pass_started_at else None,
+            "last_pass_completed_at": (
+                self.last_pass_completed_at.isoformat() if self.last_pass_completed_at else None
+            ),
+            "lag_seconds": round(lag, 3) if lag is not None else None,
+            "chunks": self.chunks,
+            "wallets": self.wallets,
+            "errors": self.errors,
+            "conflicts": self.conflicts,
+            "skipped": self.skipped,
+        }
+
+
+balance_indexer = BalanceIndexer(
+    chunk_size=settings.balance_indexer_chunk,
+    interval=settings.balance_indexer_interval,
+    lease=settings.balance_indexer_lease,
+)
@@ -1,75 +1,293 @@
+import asyncio
 import logging
-from typing import Dict, Optional
-import aiohttp
-import os
+import re
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache import Cache, cache_backend
 from .config import settings
+from .http_client import http_client
+from .money import from_base_units
 
 logger = logging.getLogger("slh_wallet.blockchain")
 
+# ERC-20 function selectors: keccak(signature)[:4]
+BALANCE_OF_SELECTOR = "0x70a08231"  # balanceOf(address)
+DECIMALS_SELECTOR = "0x313ce567"  # decimals()
+SYMBOL_SELECTOR = "0x95d89b41"  # symbol()
+
+_EVM_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+
+def is_evm_address(address: Optional[str]) -> bool:
+    return bool(address) and bool(_EVM_ADDRESS_RE.match(address))
+
+
+def encode_balance_of(owner: str) -> str:
+    """calldata של balanceOf(owner) – selector + כתובת מרופדת ל‑32 בתים"""
+    return BALANCE_OF_SELECTOR + owner[2:].lower().rjust(64, "0")
+
+
+def _hex_to_int(value: Optional[str]) -> int:
+    if not value or value == "0x":
+        return 0
+    return int(value, 16)
+
+
+def _decode_abi_string(value: Optional[str]) -> str:
+    """מפענח string מוחזר מ‑ABI (או bytes32 בחוזים ישנים)"""
+    data = bytes.fromhex((value or "0x")[2:])
+    if len(data) == 32:
+        return data.rstrip(b"\x00").decode("utf-8", errors="replace")
+    if len(data) < 64:
+        return ""
+    offset = int.from_bytes(data[0:32], "big")
+    length = int.from_bytes(data[offset:offset + 32], "big")
+    return data[offset + 32:offset + 32 + length].decode("utf-8", errors="replace")
+
+
 class BlockchainService:
     def __init__(self):
         self.bscscan_api_key = settings.bscscan_api_key
-        self.bsc_rpc_url = os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org/")
+        self.bsc_rpc_url = settings.bsc_rpc_url
         self.slh_token_address = settings.slh_token_address
+        # Token metadata never changes for a deployed contract: fetch once per process.
+        self._token_metadata: Dict[str, Dict[str, Any]] = {}
+        self._token_metadata_lock = asyncio.Lock()
+        self.cache = Cache(
+            cache_backend,
+            "bal",
+            ttl=settings.balance_cache_ttl,
+            stale_ttl=settings.balance_cache_stale_ttl,
+        )
+
+    async def _rpc_call(self, method: str, params: List[Any]) -> Any:
+        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+        async with http_client.session.post(self.bsc_rpc_url, json=payload) as response:
+            data = await response.json(content_type=None)
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        return data.get("result")
 
-    async def get_bnb_balance(self, address: str) -> Optional[float]:
+    async def get_block_number(self) -> int:
+        return _hex_to_int(await self._rpc_call("eth_blockNumber", []))
+
+    async def _eth_call(self, to: str, data: str) -> str:
+        return await self._rpc_call("eth_call", [{"to": to, "data": data}, "latest"])
+
+    async def get_token_metadata(self, token_address: Optional[str] = None) -> Dict[str, Any]:
+        """decimals + symbol של טוקן ERC-20, נשמר בזיכרון לכל חיי התהליך"""
+        token = (token_address or self.slh_token_address).lower()
+        cached = self._token_metadata.get(token)
+        if cached is not None:
+            return cached
+
+        async with self._token_metadata_lock:
+            cached = self._token_metadata.get(token)
+            if cached is not None:
+                return cached
+            decimals_raw, symbol_raw = await asyncio.gather(
+                self._eth_call(token, DECIMALS_SELECTOR),
+                self._eth_call(token, SYMBOL_SELECTOR),
+            )
+            metadata = {
+                "decimals": _hex_to_int(decimals_raw),
+                "symbol": _decode_abi_string(symbol_raw),
+            }
+            self._token_metadata[token] = metadata
+            logger.info("Loaded token metadata for %s: %s", token, metadata)
+            return metadata
+
+    async def _fetch_bnb_balance(self, address: str) -> Decimal:
+        session = http_client.session
+
+        # באמצעות BscScan API
+        if self.bscscan_api_key:
+            params = {
+                "module": "account",
+                "action": "balance",
+                "address": address,
+                "tag": "latest",
+                "apikey": self.bscscan_api_key,
+            }
+            async with session.get("https://api.bscscan.com/api", params=params) as response:
+                data = await response.json()
+                if data.get('status') == '1':
+                    balance_wei = int(data['result'])
+                    return from_base_units(balance_wei, 18)
+
+        # גיבוי עם RPC
+        result = await self._rpc_call("eth_getBalance", [address, "latest"])
+        if result is None:
+            raise RuntimeError("eth_getBalance returned no result")
+        return from_base_units(_hex_to_int(result), 18)
+
+    async def _fetch_slh_balance(self, address: str) -> Decimal:
+        metadata, raw = await asyncio.gather(
+            self.get_token_metadata(),
+            self._eth_call(self.slh_token_address, encode_balance_of(address)),
+        )
+        return from_base_units(_hex_to_int(raw), metadata["decimals"])
+
+    async def get_bnb_balance(self, address: str) -> Optional[Decimal]:
         """מקבל את יתרת BNB מכתובת"""
         try:
             if not address or address == "0x" or len(address) < 10:
-                return 0.0
-                
-            async with aiohttp.ClientSession() as session:
-                # באמצעות BscScan API
-                if self.bscscan_api_key:
-                    url = f"https://api.bscscan.com/api?module=account&action=balance&address={address}&tag=latest&apikey={self.bscscan_api_key}"
-                    async with session.get(url) as response:
-                        data = await response.json()
-                        if data.get('status') == '1':
-                            balance_wei = int(data['result'])
-                            return balance_wei / 10**18
-
-                # גיבוי עם RPC
-                payload = {
-                    "jsonrpc": "2.0",
-                    "method": "eth_getBalance",
-                    "params": [address, "latest"],
-                    "id": 1
-                }
-                async with session.post(self.bsc_rpc_url, json=payload) as response:
-                    data = await response.json()
-                    if 'result' in data:
-                        balance_wei = int(data['result'], 16)
-                        return balance_wei / 10**18
-                        
+                return Decimal(0)
+
+            return await self.cache.get_or_load(
+                ("bsc", "BNB", address.lower()),
+                lambda: self._fetch_bnb_balance(address),
+            )
+
         except Exception as e:
             logger.error("Error fetching BNB balance for %s: %s", address, e)
             
-        return 0.0
+        return Decimal(0)
 
-    async def get_slh_balance(self, address: str) -> Optional[float]:
-        """מקבל את יתרת SLH Token"""
+    async def get_slh_balance(self, address: str) -> Optional[Decimal]:
+        """מקבל את יתרת SLH Token דרך balanceOf ב‑eth_call"""
         try:
-            if not address or address == "0x" or not self.slh_token_address:
-                return 0.0
+            if not is_evm_address(address) or not self.slh_token_address:
+                return Decimal(0)
+
+            return await self.cache.get_or_load(
+                ("bsc", self.slh_token_address.lower(), address.lower()),
+                lambda: self._fetch_slh_balance(address),
+            )
 
-            # TODO: Implement actual SLH token balance check using web3
-            # For now return mock data
-            return 1500.0  # Mock data
-            
         except Exception as e:
             logger.error("Error fetching SLH balance for %s: %s", address, e)
             
-        return 0.0
+        return Decimal(0)
 
-    async def get_balances(self, bnb_address: str, slh_address: str) -> Dict[str, float]:
+    async def get_balances(self, bnb_address: str, slh_address: str) -> Dict[str, Decimal]:
         """מחזיר את כל היתרות"""
-        bnb_balance = await self.get_bnb_balance(bnb_address)
-        slh_balance = await self.get_slh_balance(slh_address or bnb_address)
-        
+        bnb_balance, slh_balance = await asyncio.gather(
+            self.get_bnb_balance(bnb_address),
+            self.get_slh_balance(slh_address or bnb_address),
+        )
+
         return {
             "bnb": bnb_balance,
             "slh": slh_balance,
         }
 
+    async def _rpc_batch(self, calls: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """שולח מערך JSON-RPC אחד ומחזיר את התשובות לפי id"""
+        session = http_client.session
+        async with session.post(self.bsc_rpc_url, json=calls) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if isinstance(data, dict):
+            # Some nodes answer a rejected batch with a single error object.
+            raise RuntimeError(data.get("error") or "Unexpected JSON-RPC batch response")
+        return {item.get("id"): item for item in data}
+
+    async def _fetch_balance_chunk(
+        self, addresses: List[str], slh_decimals: Optional[int]
+    ) -> Dict[str, Dict[str, Any]]:
+        calls: List[Dict[str, Any]] = []
+        for i, address in enumerate(addresses):
+            calls.append(
+                {
+                    "jsonrpc": "2.0",
+                    "method": "eth_getBalance",
+                    "params": [address, "latest"],
+                    "id": 2 * i,
+                }
+            )
+            if self.slh_token_address:
+                calls.append(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "eth_call",
+                        "params": [
+                            {"to": self.slh_token_address, "data": encode_balance_of(address)},
+                            "latest",
+                        ],
+                        "id": 2 * i + 1,
+                    }
+                )
+
+        try:
+            replies = await self._rpc_batch(calls)
+        except Exception as e:  # noqa: BLE001
+            logger.error("RPC batch of %d addresses failed: %s", len(addresses), e)
+            return {
+                address: {"bnb": None, "slh": None, "error": str(e)}
+                for address in addresses
+            }
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for i, address in enumerate(addresses):
+            entry: Dict[str, Any] = {"bnb": None, "slh": None, "error": None}
+            errors = []
+
+            bnb_reply = replies.get(2 * i) or {"error": "missing reply"}
+            if "result" in bnb_reply:
+                entry["bnb"] = from_base_units(_hex_to_int(bnb_reply["result"]), 18)
+            else:
+                errors.append(f"bnb: {bnb_reply.get('error')}")
+
+            if self.slh_token_address:
+                slh_reply = replies.get(2 * i + 1) or {"error": "missing reply"}
+                if slh_decimals is None:
+                    errors.append("slh: token metadata unavailable")
+                elif "result" in slh_reply:
+                    entry["slh"] = from_base_units(_hex_to_int(slh_reply["result"]), slh_decimals)
+                else:
+                    errors.append(f"slh: {slh_reply.get('error')}")
+            else:
+                entry["slh"] = Decimal(0)
+
+            if errors:
+                entry["error"] = "; ".join(errors)
+            results[address] = entry
+
+            # Bulk refreshes warm the per-address cache used by get_balances.
+            if entry["bnb"] is not None:
+                await self.cache.put(("bsc", "BNB", address.lower()), entry["bnb"])
+            if entry["slh"] is not None and self.slh_token_address:
+                await self.cache.put(("bsc", self.slh_token_address.lower(), address.lower()), entry["slh"])
+        return results
+
+    async def get_balances_many(self, addresses: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """יתרות BNB + SLH לכתובות רבות דרך JSON-RPC batch.
+
+        Addresses are packed into batches of ``settings.rpc_batch_size`` (two
+        calls per address) and at most ``settings.rpc_batch_concurrency``
+        batches are in flight at once.  The result is keyed by address and
+        each entry carries its own ``error`` so one bad reply never fails the
+        whole refresh.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        valid: List[str] = []
+        for address in dict.fromkeys(addresses):
+            if is_evm_address(address):
+                valid.append(address)
+            else:
+                results[address] = {"bnb": None, "slh": None, "error": "invalid address"}
+
+        slh_decimals: Optional[int] = None
+        if self.slh_token_address and valid:
+            try:
+                slh_decimals = (await self.get_token_metadata())["decimals"]
+            except Exception as e:  # noqa: BLE001
+                logger.error("Error fetching SLH token metadata: %s", e)
+
+        size = max(1, settings.rpc_batch_size)
+        chunks = [valid[i:i + size] for i in range(0, len(valid), size)]
+        semaphore = asyncio.Semaphore(max(1, settings.rpc_batch_concurrency))
+
+        async def run(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                return await self._fetch_balance_chunk(chunk, slh_decimals)
+
+        for chunk_result in await asyncio.gather(*(run(chunk) for chunk in chunks)):
+            results.update(chunk_result)
+        return results
+
 
 blockchain_service = BlockchainService()
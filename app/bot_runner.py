@@ -0,0 +1,81 @@
+"""Standalone Telegram bot process.
+
+Runs the same ``Application`` and handlers as the web tier, but consumes
+updates itself (long polling, or its own webhook listener) so the bot can be
+scaled and deployed apart from the website. Set ``TELEGRAM_MODE=standalone``
+on the web process when using it.
+
+    python -m app.bot_runner
+"""
+
+import asyncio
+import logging
+import signal
+
+from telegram import Update
+
+from .cache import cache_backend
+from .config import settings
+from .db import engine
+from .http_client import http_client
+from .rate_limit import rate_limiter
+from .telegram_bot import get_application, shutdown_application
+from .write_behind import write_behind
+
+logger = logging.getLogger("slh_wallet.bot.runner")
+
+
+async def run() -> None:
+    await http_client.start()
+    await cache_backend.start()
+    write_behind.start()
+
+    application = await get_application()
+    await application.start()
+
+    if settings.bot_runner_mode == "webhook":
+        if not settings.bot_webhook_url:
+            raise RuntimeError("BOT_WEBHOOK_URL is required for BOT_RUNNER_MODE=webhook")
+        await application.updater.start_webhook(
+            listen="0.0.0.0",
+            port=settings.bot_webhook_port,
+            url_path="telegram/webhook",
+            webhook_url=settings.bot_webhook_url,
+            secret_token=settings.telegram_webhook_secret or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    logger.info("Bot runner started (%s)", settings.bot_runner_mode)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Stopping bot runner, draining in-flight updates...")
+    try:
+        # Stop fetching first, then let Application.stop() finish queued updates.
+        await application.updater.stop()
+        await application.stop()
+    finally:
+        await shutdown_application()
+        await write_behind.stop()
+        await rate_limiter.close()
+        await cache_backend.close()
+        await http_client.close()
+        await engine.dispose()
+    logger.info("Bot runner stopped")
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    )
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
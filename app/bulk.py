@@ -0,0 +1,226 @@
+"""Bulk export / import of whole tables.
+
+Exports stream rows through a server-side cursor (``yield_per``) and emit
+NDJSON or CSV one partition at a time, so memory stays flat regardless of
+table size. Imports go through Postgres ``COPY FROM STDIN`` via asyncpg,
+streaming the input instead of buffering it.
+"""
+
+import csv
+import datetime as dt
+import io
+import json
+import re
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Integer, Numeric, select, text
+
+from . import models, referrals
+from .cache import admin_cache, offers_cache
+from .config import settings
+from .db import SessionLocal
+from .money import format_amount
+
+EXPORT_TABLES = {
+    "wallets": models.Wallet,
+    "trade_offers": models.TradeOffer,
+    "referrals": models.Referral,
+}
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class BulkError(ValueError):
+    pass
+
+
+def _model(table: str):
+    model = EXPORT_TABLES.get(table)
+    if model is None:
+        raise BulkError(f"Unknown table: {table}")
+    return model
+
+
+def _columns(table: str) -> List[str]:
+    return [column.key for column in _model(table).__table__.columns]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return format_amount(value)  # exact; never a float
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return format_amount(value)  # str() would give "0E-18" for a NUMERIC zero
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return value
+
+
+async def export_rows(table: str, fmt: str) -> AsyncIterator[str]:
+    """Yield the whole table as NDJSON lines or CSV (with a header), in primary-key order."""
+    if fmt not in FORMATS:
+        raise BulkError(f"Unknown format: {fmt}")
+    model = _model(table)
+    columns = _columns(table)
+    stmt = (
+        select(*model.__table__.columns)
+        .order_by(*model.__table__.primary_key.columns)
+        .execution_options(yield_per=settings.bulk_yield_per)
+    )
+
+    async with SessionLocal() as db:
+        # An export can outlive DB_STATEMENT_TIMEOUT_MS; lift it for this transaction only.
+        await db.execute(text("SET LOCAL statement_timeout = 0"))
+        result = await db.stream(stmt)
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+        async for partition in result.partitions():
+            if fmt == "ndjson":
+                yield "".join(
+                    json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+                    for row in partition
+                )
+            else:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([_csv_value(v) for v in row] for row in partition)
+                yield buffer.getvalue()
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def _converters(table: str) -> Dict[str, Callable[[Any], Any]]:
+    """Python value parsers per column, as binary COPY needs exact types."""
+    converters: Dict[str, Callable[[Any], Any]] = {}
+    for column in _model(table).__table__.columns:
+        if isinstance(column.type, Numeric):
+            converters[column.key] = lambda v: Decimal(str(v))
+        elif isinstance(column.type, DateTime):
+            converters[column.key] = lambda v: v if isinstance(v, dt.datetime) else dt.datetime.fromisoformat(v)
+        elif isinstance(column.type, Boolean):
+            converters[column.key] = bool
+        elif isinstance(column.type, Integer):
+            converters[column.key] = int
+        else:
+            converters[column.key] = str
+    return converters
+
+
+async def import_rows(table: str, fmt: str, chunks: AsyncIterator[bytes], skip_existing: bool = False) -> int:
+    """COPY rows from an NDJSON or CSV byte stream into ``table``; returns the row count.
+
+    CSV must start with a header naming the columns; NDJSON objects may omit
+    columns, which then take their defaults (every line must use the same
+    keys). With ``skip_existing`` rows are staged in a temporary table and
+    rows whose primary key already exists are skipped; otherwise the COPY goes
+    straight into the table and a duplicate aborts the whole import.
+    """
+    if fmt not in FORMATS:
+        raise BulkError(f"Unknown format: {fmt}")
+    model = _model(table)
+    known = set(_columns(table))
+
+    async with SessionLocal() as db:
+        await db.execute(text("SET LOCAL statement_timeout = 0"))
+        target = table
+        if skip_existing:
+            target = f"import_{table}"
+            await db.execute(
+                text(f"CREATE TEMP TABLE {target} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+            )
+        raw = await (await db.connection()).get_raw_connection()
+        conn = raw.driver_connection  # asyncpg: COPY is not exposed through SQLAlchemy
+
+        lines = _lines(chunks)
+        if fmt == "csv":
+            header = await anext(lines, b"")
+            columns = next(csv.reader([header.decode("utf-8")]), [])
+            _check_columns(columns, known)
+
+            async def body() -> AsyncIterator[bytes]:
+                async for line in lines:
+                    yield line + b"\n"
+
+            status = await conn.copy_to_table(target, source=body(), columns=columns, format="csv")
+        else:
+            first = await _first_record(lines)
+            if first is None:
+                return 0
+            columns = list(first)
+            _check_columns(columns, known)
+            converters = _converters(table)
+
+            def record(obj: Dict[str, Any]) -> tuple:
+                if obj.keys() != first.keys():
+                    raise BulkError("Every NDJSON line must have the same keys")
+                return tuple(
+                    None if obj[c] is None else converters[c](obj[c]) for c in columns
+                )
+
+            async def records() -> AsyncIterator[tuple]:
+                yield record(first)
+                async for line in lines:
+                    if line.strip():
+                        yield record(json.loads(line))
+
+            status = await conn.copy_records_to_table(target, records=records(), columns=columns)
+
+        count = int(re.sub(r"\D", "", status) or 0)
+        if skip_existing:
+            column_list = ", ".join(columns)
+            result = await db.execute(
+                text(
+                    f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {target} "
+                    "ON CONFLICT DO NOTHING"
+                )
+            )
+            count = result.rowcount
+        if table == "referrals":
+            await referrals.rebuild_stats(db)
+        # Imported explicit ids must not be handed out again by the serial sequence.
+        (pk,) = model.__table__.primary_key.columns
+        if isinstance(pk.type, Integer):
+            await db.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{pk.name}'), "
+                    f"GREATEST((SELECT MAX({pk.name}) FROM {table}), 1))"
+                )
+            )
+        await db.commit()
+
+    if table == "trade_offers":
+        await offers_cache.bump()
+    await admin_cache.invalidate("summary")
+    return count
+
+
+def _check_columns(columns: List[str], known: set) -> None:
+    unknown = [c for c in columns if c not in known]
+    if not columns or unknown:
+        raise BulkError(f"Unknown or missing columns: {unknown or columns}")
+
+
+async def _first_record(lines: AsyncIterator[bytes]) -> Optional[Dict[str, Any]]:
+    async for line in lines:
+        if line.strip():
+            return json.loads(line)
+    return None
@@ -0,0 +1,297 @@
+import abc
+import asyncio
+import datetime as dt
+import json
+import logging
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger("slh_wallet.cache")
+
+
+class CacheBackend(abc.ABC):
+    """Storage behind :class:`Cache`. Values are plain JSON-like data."""
+
+    name = "base"
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """Drop ``key`` everywhere (other workers included)."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process LRU with per-entry expiry."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "entries": len(self._entries), "evictions": self.evictions}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, dt.datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _json_object_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "__decimal__" in obj:
+            return Decimal(obj["__decimal__"])
+        if "__datetime__" in obj:
+            return dt.datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-protocol backend shared by all workers.
+
+    A short-lived in-process copy (``local_ttl``) absorbs hot keys; deletes are
+    broadcast on a pub/sub channel so every worker drops its local copy too.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "slh:", local_ttl: float = 1.0, max_local_entries: int = 10000) -> None:
+        import redis.asyncio as redis  # imported lazily: only needed when configured
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidate"
+        self.local_ttl = local_ttl
+        self._local = MemoryCacheBackend(max_local_entries)
+        self._listener: Optional["asyncio.Task[None]"] = None
+        self.round_trips = 0
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._redis.aclose()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._local.delete(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Cache invalidation listener failed, retrying: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._local.get(key)
+        if value is not None:
+            return value
+        self.round_trips += 1
+        raw = await self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        value = json.loads(raw, object_hook=_json_object_hook)
+        if self.local_ttl > 0:
+            await self._local.set(key, value, self.local_ttl)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.round_trips += 1
+        raw = json.dumps(value, default=_json_default)
+        await self._redis.set(self.prefix + key, raw, px=max(1, int(ttl * 1000)))
+        if self.local_ttl > 0:
+            await self._local.set(key, value, min(self.local_ttl, ttl))
+
+    async def delete(self, key: str) -> None:
+        self.round_trips += 2
+        await self._local.delete(key)
+        await self._redis.delete(self.prefix + key)
+        await self._redis.publish(self.channel, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "round_trips": self.round_trips,
+            "local": self._local.stats(),
+        }
+
+
+def build_cache_backend(url: str) -> CacheBackend:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url, local_ttl=settings.cache_local_ttl)
+    if url in ("", "memory://"):
+        return MemoryCacheBackend(settings.cache_max_entries)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+class Cache:
+    """Namespaced read-through cache with stale-while-revalidate and
+    single-flight loading on top of a :class:`CacheBackend`.
+
+    * fresh entries (age < ``ttl``) are served directly;
+    * stale entries (age < ``ttl + stale_ttl``) are served immediately while a
+      single background refresh runs;
+    * concurrent misses for the same key within a worker share one upstream call.
+    """
+
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: float, stale_ttl: float = 0.0) -> None:
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.namespace, *(str(p) for p in parts)])
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        entry = await self.backend.get(self._key(key))
+        if entry is None or time.time() - entry["t"] >= self.ttl:
+            return None
+        return entry["v"]
+
+    async def put(self, key: Hashable, value: Any) -> None:
+        await self.backend.set(self._key(key), {"v": value, "t": time.time()}, self.ttl + self.stale_ttl)
+
+    async def invalidate(self, key: Hashable) -> None:
+        await self.backend.delete(self._key(key))
+
+    async def generation(self) -> int:
+        """Current namespace generation; include it in keys that :meth:`bump` must drop."""
+        return await self.backend.get(f"{self.namespace}:__gen__") or 0
+
+    async def bump(self) -> None:
+        """Invalidate every generation-scoped key of the namespace at once."""
+        await self.backend.set(f"{self.namespace}:__gen__", time.time_ns(), 30 * 86400)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        skey = self._key(key)
+        entry = await self.backend.get(skey)
+        if entry is not None:
+            age = time.time() - entry["t"]
+            if age < self.ttl:
+                self.hits += 1
+                return entry["v"]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if skey not in self._inflight:
+                    self.refreshes += 1
+                    self._start_load(skey, loader)
+                return entry["v"]
+
+        task = self._inflight.get(skey)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_load(skey, loader)
+        # shield: a cancelled caller must not cancel the load other callers wait on
+        return await asyncio.shield(task)
+
+    def _start_load(self, skey: str, loader: Callable[[], Awaitable[Any]]) -> "asyncio.Task[Any]":
+        async def run() -> Any:
+            try:
+                value = await loader()
+                if value is not None:
+                    await self.backend.set(skey, {"v": value, "t": time.time()}, self.ttl + self.stale_ttl)
+                return value
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self._inflight.pop(skey, None)
+
+        task = asyncio.ensure_future(run())
+        # Background refreshes may have no awaiter; consume their exception.
+        task.add_done_callback(_log_task_error)
+        self._inflight[skey] = task
+        return task
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
+
+
+def _log_task_error(task: "asyncio.Task[Any]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug("Cache load failed: %s", task.exception())
+
+
+cache_backend = build_cache_backend(settings.cache_url)
+
+# Rendered public user cards (see app/cards.py)
+card_cache = Cache(cache_backend, "card", ttl=settings.card_cache_ttl)
+offers_cache = Cache(cache_backend, "offers", ttl=settings.offers_cache_ttl)
+admin_cache = Cache(cache_backend, "admin", ttl=settings.admin_summary_cache_ttl)
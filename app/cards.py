@@ -0,0 +1,103 @@
+import datetime as dt
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
+
+from . import models
+from .cache import card_cache
+from .config import settings
+from .db import SessionLocal
+from .money import display_amount
+
+templates = Jinja2Templates(directory="app/templates")
+# Templates only change with a deploy: compile once, skip the per-render mtime check.
+templates.env.auto_reload = False
+templates.env.filters["amount"] = display_amount
+_card_template = templates.get_template("user_card.html")
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def card_query():
+    """Wallet rows joined with their latest balance snapshot."""
+    snapshot = models.WalletBalanceSnapshot
+    return select(models.Wallet, snapshot).outerjoin(
+        snapshot, snapshot.telegram_id == models.Wallet.telegram_id
+    )
+
+
+def qr_targets(telegram_id: str, bnb_address: Optional[str], ton_address: Optional[str]) -> Dict[str, str]:
+    """What each QR variant of a card encodes."""
+    targets = {"card": f"{settings.base_url}/u/{telegram_id}"}
+    if bnb_address:
+        targets["bnb"] = bnb_address
+    if ton_address:
+        targets["ton"] = ton_address
+    return targets
+
+
+def render_card(
+    wallet: models.Wallet, snapshot: Optional[models.WalletBalanceSnapshot]
+) -> Dict[str, Any]:
+    """Render a user card; returns the HTML with its validators."""
+    data = {c.key: getattr(wallet, c.key) for c in models.Wallet.__table__.columns}
+    # Balances come from the indexer's snapshot, never from a live chain call.
+    data["slh_balance"] = snapshot.slh_balance if snapshot else None
+    data["slh_ton_balance"] = snapshot.slh_ton_balance if snapshot else None
+
+    updated_at = wallet.updated_at or wallet.created_at or _EPOCH
+    fetched_at = snapshot.fetched_at if snapshot else None
+    last_modified = max(updated_at, fetched_at) if fetched_at else updated_at
+    etag_parts = [wallet.telegram_id, f"{updated_at.timestamp():.6f}"]
+    if fetched_at:
+        etag_parts.append(f"{fetched_at.timestamp():.6f}")
+
+    html = _card_template.render(
+        wallet=data,
+        slh_token_address=settings.slh_token_address,
+        base_url=settings.base_url,
+    )
+    return {
+        "html": html,
+        "etag": f'W/"{"-".join(etag_parts)}"',
+        "last_modified": last_modified.replace(microsecond=0),
+        "qr": qr_targets(wallet.telegram_id, wallet.bnb_address, wallet.ton_address),
+    }
+
+
+async def _load_card(telegram_id: str) -> Optional[Dict[str, Any]]:
+    async with SessionLocal() as db:
+        row = (
+            await db.execute(card_query().where(models.Wallet.telegram_id == telegram_id))
+        ).one_or_none()
+    return render_card(*row) if row else None
+
+
+async def get_card(telegram_id: str) -> Optional[Dict[str, Any]]:
+    return await card_cache.get_or_load(telegram_id, lambda: _load_card(telegram_id))
+
+
+def card_headers(card: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "ETag": card["etag"],
+        "Last-Modified": format_datetime(card["last_modified"], usegmt=True),
+        "Cache-Control": f"public, max-age={settings.card_max_age}",
+    }
+
+
+def is_not_modified(card: Dict[str, Any], if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Conditional GET check; If-None-Match wins over If-Modified-Since (RFC 9110)."""
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or card["etag"].removeprefix("W/") in tags
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=dt.timezone.utc)
+        return card["last_modified"] <= since
+    return False
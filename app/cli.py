@@ -0,0 +1,182 @@
+"""Maintenance commands.
+
+    python -m app.cli prerender-cards --out public/
+    python -m app.cli pregenerate-qr --format svg
+    python -m app.cli export wallets --format csv --out wallets.csv
+    python -m app.cli import wallets wallets.csv --format csv --skip-existing
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import select
+
+from . import bulk, models
+from .cache import cache_backend
+from .cards import card_headers, card_query, qr_targets, render_card
+from .db import SessionLocal, engine
+from .qr import qr_cache
+
+logger = logging.getLogger("slh_wallet.cli")
+
+
+def _write_file(path: str, data: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)  # a CDN sync never picks up a half-written file
+
+
+async def prerender_cards(out: str, chunk: int) -> int:
+    """Render every user card to ``<out>/u/<telegram_id>/index.html``.
+
+    The headers the app would send (ETag, Last-Modified, Cache-Control) are
+    written next to each page as ``headers.json`` for the CDN upload step.
+    Wallets are read in telegram_id keyset chunks, one query per chunk.
+    """
+    cursor = ""
+    count = 0
+    while True:
+        async with SessionLocal() as db:
+            rows = (
+                await db.execute(
+                    card_query()
+                    .where(models.Wallet.telegram_id > cursor)
+                    .order_by(models.Wallet.telegram_id)
+                    .limit(chunk)
+                )
+            ).all()
+        if not rows:
+            break
+        for wallet, snapshot in rows:
+            if not wallet.telegram_id.isdigit():
+                # Used as a path component below; never let it escape ``out``.
+                logger.warning("Skipping wallet with non-numeric telegram_id %r", wallet.telegram_id)
+                continue
+            card: Dict[str, Any] = render_card(wallet, snapshot)
+            base = os.path.join(out, "u", wallet.telegram_id)
+            _write_file(os.path.join(base, "index.html"), card["html"])
+            _write_file(os.path.join(base, "headers.json"), json.dumps(card_headers(card)))
+        count += len(rows)
+        cursor = rows[-1][0].telegram_id
+        logger.info("Pre-rendered %d cards", count)
+    return count
+
+
+async def pregenerate_qr(kinds, chunk: int) -> int:
+    """Encode the card/BNB/TON QR codes of every wallet into the QR cache.
+
+    Needs QR_CACHE_DIR so the images outlive this process; each chunk is
+    encoded concurrently in the thread pool.
+    """
+    if not qr_cache.directory:
+        raise SystemExit("QR_CACHE_DIR must be set to pre-generate QR codes")
+    wallet = models.Wallet
+    cursor = ""
+    count = 0
+    while True:
+        async with SessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(wallet.telegram_id, wallet.bnb_address, wallet.ton_address)
+                    .where(wallet.telegram_id > cursor)
+                    .order_by(wallet.telegram_id)
+                    .limit(chunk)
+                )
+            ).all()
+        if not rows:
+            break
+        jobs = [
+            qr_cache.get(data, kind)
+            for row in rows
+            for data in qr_targets(row.telegram_id, row.bnb_address, row.ton_address).values()
+            for kind in kinds
+        ]
+        await asyncio.gather(*jobs)
+        count += len(jobs)
+        cursor = rows[-1].telegram_id
+        logger.info("Pre-generated %d QR codes", count)
+    return count
+
+
+async def export_table(table: str, fmt: str, out: str) -> None:
+    """Stream ``table`` to ``out`` (``-`` for stdout), one cursor partition at a time."""
+    f = sys.stdout if out == "-" else open(out, "w", encoding="utf-8", newline="")
+    try:
+        async for chunk in bulk.export_rows(table, fmt):
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+async def _read_chunks(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(f.read, size):
+            yield chunk
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "prerender-cards":
+            count = await prerender_cards(args.out, args.chunk)
+            print(f"Rendered {count} cards into {args.out}")
+        elif args.command == "pregenerate-qr":
+            count = await pregenerate_qr(args.format, args.chunk)
+            print(f"Generated {count} QR codes into {qr_cache.directory}")
+        elif args.command == "export":
+            await export_table(args.table, args.format, args.out)
+        elif args.command == "import":
+            count = await bulk.import_rows(
+                args.table, args.format, _read_chunks(args.file), skip_existing=args.skip_existing
+            )
+            print(f"Imported {count} rows into {args.table}", file=sys.stderr)
+    finally:
+        await cache_backend.close()
+        await engine.dispose()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prerender = commands.add_parser("prerender-cards", help="Render user cards as static files for a CDN")
+    prerender.add_argument("--out", required=True, help="Output directory")
+    prerender.add_argument("--chunk", type=int, default=500, help="Wallets per query")
+
+    qr = commands.add_parser("pregenerate-qr", help="Encode every wallet's QR codes into QR_CACHE_DIR")
+    qr.add_argument("--format", action="append", choices=["png", "svg"], help="Repeatable (default: both)")
+    qr.add_argument("--chunk", type=int, default=500, help="Wallets per query")
+
+    tables = sorted(bulk.EXPORT_TABLES)
+    formats = sorted(bulk.FORMATS)
+    export = commands.add_parser("export", help="Stream a table as NDJSON or CSV")
+    export.add_argument("table", choices=tables)
+    export.add_argument("--format", choices=formats, default="ndjson")
+    export.add_argument("--out", default="-", help="Output file (default: stdout)")
+
+    load = commands.add_parser("import", help="COPY an NDJSON or CSV file into a table")
+    load.add_argument("table", choices=tables)
+    load.add_argument("file", help="Input file, - for stdin")
+    load.add_argument("--format", choices=formats, default="ndjson")
+    load.add_argument("--skip-existing", action="store_true", help="Skip rows whose primary key exists")
+
+    args = parser.parse_args()
+    if args.command == "pregenerate-qr" and not args.format:
+        args.format = ["png", "svg"]
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+from decimal import Decimal
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -10,6 +13,132 @@ class Settings(BaseSettings):
         "0xACb0A09414CEA1C879c67bB7A877E4e19480f022", alias="SLH_TOKEN_ADDRESS"
     )
 
+    log_level: str = Field("INFO", alias="LOG_LEVEL")
+
+    # "webhook": the web process handles /telegram/webhook.
+    # "standalone": updates are consumed by `python -m app.bot_runner` instead.
+    telegram_mode: str = Field("webhook", alias="TELEGRAM_MODE")
+    # Standalone runner: "polling" or "webhook" (its own listener on BOT_WEBHOOK_PORT)
+    bot_runner_mode: str = Field("polling", alias="BOT_RUNNER_MODE")
+    bot_webhook_url: str = Field("", alias="BOT_WEBHOOK_URL")
+    bot_webhook_port: int = Field(8081, alias="BOT_WEBHOOK_PORT")
+
+    # Telegram webhook ingestion (see app/telegram_queue.py)
+    telegram_webhook_secret: str = Field("", alias="TELEGRAM_WEBHOOK_SECRET")
+    telegram_workers: int = Field(8, alias="TELEGRAM_WORKERS")
+    telegram_queue_size: int = Field(1000, alias="TELEGRAM_QUEUE_SIZE")
+    telegram_dedup_size: int = Field(10000, alias="TELEGRAM_DEDUP_SIZE")
+    telegram_drain_timeout: float = Field(20.0, alias="TELEGRAM_DRAIN_TIMEOUT")
+
+    # Inbound rate limits: rule -> {"user": "N/seconds", "global": "N/seconds"}.
+    # RATE_LIMITS takes a JSON object; buckets live in RATE_LIMIT_URL (defaults to CACHE_URL).
+    rate_limit_url: str = Field("", alias="RATE_LIMIT_URL")
+    rate_limits: Dict[str, Dict[str, str]] = Field(
+        {
+            "cmd:start": {"user": "5/60", "global": "30/1"},
+            "cmd:wallet": {"user": "10/60", "global": "30/1"},
+            "cmd:set_bnb": {"user": "5/60", "global": "20/1"},
+            "cmd:set_ton": {"user": "5/60", "global": "20/1"},
+            "cmd:leaderboard": {"user": "5/60", "global": "20/1"},
+            "route:create_offer": {"user": "10/60", "global": "50/1"},
+            "route:buy": {"user": "20/60", "global": "50/1"},
+            "route:transfer": {"user": "20/60", "global": "100/1"},
+        },
+        alias="RATE_LIMITS",
+    )
+    # Outbound Bot API sends (python-telegram-bot AIORateLimiter)
+    telegram_send_rate: float = Field(30.0, alias="TELEGRAM_SEND_RATE")  # messages/second, all chats
+    telegram_group_send_rate: float = Field(20.0, alias="TELEGRAM_GROUP_SEND_RATE")  # messages/minute, per group
+    telegram_send_retries: int = Field(3, alias="TELEGRAM_SEND_RETRIES")
+
+    # Database connection pool (one per worker, shared by web routes and the bot)
+    db_pool_size: int = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30.0, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(1800, alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, alias="DB_POOL_PRE_PING")
+    db_statement_timeout_ms: int = Field(15000, alias="DB_STATEMENT_TIMEOUT_MS")  # 0 disables
+    # How long a migration waits for a table lock before startup fails (app/db_schema.py)
+    db_migration_lock_timeout_ms: int = Field(30000, alias="DB_MIGRATION_LOCK_TIMEOUT_MS")
+    # Set when connecting through PgBouncer in transaction mode: disables
+    # prepared statement caching and startup parameters, and applies
+    # DB_STATEMENT_TIMEOUT_MS with SET LOCAL in every transaction instead.
+    db_pgbouncer: bool = Field(False, alias="DB_PGBOUNCER")
+
+    # Write-behind batching of wallet upserts and audit rows (see app/write_behind.py)
+    write_behind_max_batch: int = Field(500, alias="WRITE_BEHIND_MAX_BATCH")
+    write_behind_flush_interval: float = Field(0.05, alias="WRITE_BEHIND_FLUSH_INTERVAL")
+
+    # Internal ledger (see app/ledger.py): queued transfers are settled in
+    # batches of LEDGER_SETTLE_BATCH every LEDGER_SETTLE_INTERVAL seconds (0 disables).
+    ledger_settle_batch: int = Field(5000, alias="LEDGER_SETTLE_BATCH")
+    ledger_settle_interval: float = Field(1.0, alias="LEDGER_SETTLE_INTERVAL")
+
+    # Staking reward accrual (see app/staking.py); 0 disables the periodic job
+    staking_accrual_interval: float = Field(300.0, alias="STAKING_ACCRUAL_INTERVAL")
+    staking_accrual_batch: int = Field(10000, alias="STAKING_ACCRUAL_BATCH")
+
+    # Referrals (see app/referrals.py): SLH_TON recorded per attributed referral
+    referral_reward_slh_ton: Decimal = Field(Decimal("0"), alias="REFERRAL_REWARD_SLH_TON")
+    leaderboard_size: int = Field(10, alias="LEADERBOARD_SIZE")
+
+    # Background balance indexer (see app/balance_indexer.py): wallets per
+    # chunk and pause between full passes (0 disables)
+    balance_indexer_chunk: int = Field(500, alias="BALANCE_INDEXER_CHUNK")
+    balance_indexer_interval: float = Field(60.0, alias="BALANCE_INDEXER_INTERVAL")
+    # Seconds a worker owns the indexer after claiming a chunk; must exceed one chunk's fetch
+    balance_indexer_lease: float = Field(300.0, alias="BALANCE_INDEXER_LEASE")
+
+    # BNB Smart Chain access
+    bscscan_api_key: str = Field("", alias="BSCSCAN_API_KEY")
+    bsc_rpc_url: str = Field("https://bsc-dataseed.binance.org/", alias="BSC_RPC_URL")
+    rpc_batch_size: int = Field(100, alias="RPC_BATCH_SIZE")  # addresses per JSON-RPC batch
+    rpc_batch_concurrency: int = Field(4, alias="RPC_BATCH_CONCURRENCY")
+
+    # TON access (toncenter v3 HTTP API); no jetton master = TON balances stay 0
+    ton_api_url: str = Field("https://toncenter.com/api/v3", alias="TON_API_URL")
+    ton_api_key: str = Field("", alias="TON_API_KEY")
+    slh_ton_jetton_master: str = Field("", alias="SLH_TON_JETTON_MASTER")
+    ton_jetton_decimals: int = Field(9, alias="TON_JETTON_DECIMALS")  # used if the master has no metadata
+    ton_batch_concurrency: int = Field(8, alias="TON_BATCH_CONCURRENCY")
+
+    # Shared cache: "memory://" (per worker) or "redis://host:6379/0" (shared by workers)
+    cache_url: str = Field("memory://", alias="CACHE_URL")
+    cache_max_entries: int = Field(10000, alias="CACHE_MAX_ENTRIES")
+    cache_local_ttl: float = Field(1.0, alias="CACHE_LOCAL_TTL")
+
+    # Balance cache: a BSC balance can only change once per block (~3s)
+    balance_cache_ttl: float = Field(3.0, alias="BALANCE_CACHE_TTL")
+    balance_cache_stale_ttl: float = Field(30.0, alias="BALANCE_CACHE_STALE_TTL")
+    card_cache_ttl: float = Field(300.0, alias="CARD_CACHE_TTL")
+    card_max_age: int = Field(60, alias="CARD_MAX_AGE")  # Cache-Control for /u/{id}
+    # QR images (see app/qr.py): in-memory LRU size and an optional directory to persist them
+    qr_cache_entries: int = Field(2048, alias="QR_CACHE_ENTRIES")
+    qr_cache_dir: str = Field("", alias="QR_CACHE_DIR")
+    offers_cache_ttl: float = Field(5.0, alias="OFFERS_CACHE_TTL")
+
+    # Tokens the order books accept (TRADE_TOKENS takes a JSON list)
+    trade_tokens: List[str] = Field(["SLH"], alias="TRADE_TOKENS")
+
+    # Admin dashboard
+    admin_dash_token: str = Field("", alias="ADMIN_DASH_TOKEN")
+    # Max age (seconds) of Telegram WebApp initData accepted by user routes; 0 = no limit
+    telegram_init_data_max_age: float = Field(86400.0, alias="TELEGRAM_INIT_DATA_MAX_AGE")
+    admin_summary_cache_ttl: float = Field(10.0, alias="ADMIN_SUMMARY_CACHE_TTL")
+    # Tables whose planner estimate (pg_class.reltuples) reaches this size are
+    # counted approximately instead of with COUNT(*). 0 = always exact.
+    admin_approx_count_threshold: int = Field(0, alias="ADMIN_APPROX_COUNT_THRESHOLD")
+    # Rows fetched per server-side cursor round trip by the bulk export (app/bulk.py)
+    bulk_yield_per: int = Field(5000, alias="BULK_YIELD_PER")
+
+    # Shared outbound HTTP client (see app/http_client.py)
+    http_pool_limit: int = Field(100, alias="HTTP_POOL_LIMIT")
+    http_pool_limit_per_host: int = Field(20, alias="HTTP_POOL_LIMIT_PER_HOST")
+    http_dns_cache_ttl: int = Field(300, alias="HTTP_DNS_CACHE_TTL")
+    http_keepalive_timeout: float = Field(30.0, alias="HTTP_KEEPALIVE_TIMEOUT")
+    http_connect_timeout: float = Field(5.0, alias="HTTP_CONNECT_TIMEOUT")
+    http_total_timeout: float = Field(15.0, alias="HTTP_TOTAL_TIMEOUT")
+
     class Config:
         env_file = ".env"
         extra = "ignore"
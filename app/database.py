@@ -1,50 +0,0 @@
-
-from __future__ import annotations
-
-import logging
-from contextlib import contextmanager
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
-
-from .config import settings
-
-logger = logging.getLogger("slh_wallet.db")
-
-engine = create_engine(
-    settings.database_url,
-    echo=False,
-    future=True,
-)
-
-SessionLocal = sessionmaker(
-    bind=engine,
-    autoflush=False,
-    autocommit=False,
-    expire_on_commit=False,
-    future=True,
-)
-
-Base = declarative_base()
-
-
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-@contextmanager
-def session_scope() -> Session:
-    """Provide a transactional scope around a series of operations."""
-    session = SessionLocal()
-    try:
-        yield session
-        session.commit()
-    except Exception:  # noqa: BLE001
-        session.rollback()
-        raise
-    finally:
-        session.close()
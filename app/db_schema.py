@@ -3,98 +3,340 @@ from __future__ import annotations
 
 import logging
 from textwrap import dedent
+from typing import List, Tuple
 
 from sqlalchemy import text
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection
+
+from .config import settings
 
 logger = logging.getLogger("slh_wallet.db_schema")
 
 
-DDL_STATEMENTS = [
-    # wallets table
-    dedent(
-        """
-        CREATE TABLE IF NOT EXISTS wallets (
-            telegram_id VARCHAR(64) PRIMARY KEY,
-            username VARCHAR(64),
-            first_name VARCHAR(128),
-            last_name VARCHAR(128),
-            bnb_address VARCHAR(255),
-            slh_address VARCHAR(255),
-            slh_ton_address VARCHAR(255),
-            bank_account_name VARCHAR(255),
-            bank_account_number VARCHAR(64),
-            internal_slh_balance DOUBLE PRECISION DEFAULT 0,
-            internal_slh_locked DOUBLE PRECISION DEFAULT 0,
-            created_at TIMESTAMPTZ DEFAULT NOW(),
-            updated_at TIMESTAMPTZ DEFAULT NOW()
-        );
-        """
+# Versioned migrations, applied in order and recorded in ``schema_migrations``.
+# Never edit a step that has shipped; append a new one instead. Version 1 is
+# written with IF NOT EXISTS so it also adopts databases that were created by
+# the old run-everything-on-boot code or by sql/schema_full.sql +
+# sql/schema_patch.sql.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (
+        1,
+        "baseline",
+        [
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS wallets (
+                    telegram_id VARCHAR(64) PRIMARY KEY,
+                    username VARCHAR(64),
+                    first_name VARCHAR(128),
+                    last_name VARCHAR(128),
+                    bnb_address VARCHAR(255),
+                    slh_address VARCHAR(255),
+                    slh_ton_address VARCHAR(255),
+                    bank_account_name VARCHAR(255),
+                    bank_account_number VARCHAR(64),
+                    internal_slh_balance DOUBLE PRECISION DEFAULT 0,
+                    internal_slh_locked DOUBLE PRECISION DEFAULT 0,
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS trade_offers (
+                    id SERIAL PRIMARY KEY,
+                    seller_telegram_id VARCHAR(64) NOT NULL,
+                    buyer_telegram_id VARCHAR(64),
+                    token_symbol VARCHAR(32) NOT NULL DEFAULT 'SLH',
+                    amount DOUBLE PRECISION NOT NULL,
+                    price_bnb DOUBLE PRECISION NOT NULL,
+                    status VARCHAR(32) NOT NULL DEFAULT 'ACTIVE',
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS internal_transfers (
+                    id SERIAL PRIMARY KEY,
+                    from_telegram_id VARCHAR(64) NOT NULL,
+                    to_telegram_id VARCHAR(64) NOT NULL,
+                    amount DOUBLE PRECISION NOT NULL,
+                    memo VARCHAR(255),
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS staking_positions (
+                    id SERIAL PRIMARY KEY,
+                    telegram_id VARCHAR(64) NOT NULL,
+                    amount_locked DOUBLE PRECISION NOT NULL,
+                    annual_rate_percent DOUBLE PRECISION NOT NULL DEFAULT 120.0,
+                    started_at TIMESTAMPTZ DEFAULT NOW(),
+                    unlock_at TIMESTAMPTZ,
+                    is_active BOOLEAN NOT NULL DEFAULT TRUE
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS referrals (
+                    id SERIAL PRIMARY KEY,
+                    referrer_telegram_id VARCHAR(64) NOT NULL,
+                    referred_telegram_id VARCHAR(64) NOT NULL,
+                    reward_slh_ton NUMERIC(36, 18) NOT NULL DEFAULT 0,
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS transaction_logs (
+                    id SERIAL PRIMARY KEY,
+                    telegram_id VARCHAR(64) NOT NULL,
+                    kind VARCHAR(32) NOT NULL,
+                    description VARCHAR(512),
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            "CREATE INDEX IF NOT EXISTS ix_transaction_logs_telegram_id ON transaction_logs (telegram_id);",
+            # Columns that older databases may be missing (schema_patch.sql).
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS slh_address VARCHAR(255);",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS ton_address VARCHAR(128);",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS slh_ton_address VARCHAR(255);",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS bank_account_name VARCHAR(255);",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS bank_account_number VARCHAR(64);",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS internal_slh_balance DOUBLE PRECISION DEFAULT 0;",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS internal_slh_locked DOUBLE PRECISION DEFAULT 0;",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();",
+            "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();",
+            "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS seller_telegram_id VARCHAR(64);",
+            "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS buyer_telegram_id VARCHAR(64);",
+            "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS status VARCHAR(32) DEFAULT 'ACTIVE';",
+            "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();",
+        ],
+    ),
+    (
+        2,
+        "trade_offers_indexes",
+        [
+            # Newest-first listing per status (keyset pagination on
+            # (created_at, id)), the same per token, and an ACTIVE-only price book.
+            "CREATE INDEX IF NOT EXISTS ix_trade_offers_status_created ON trade_offers (status, created_at DESC, id DESC);",
+            "CREATE INDEX IF NOT EXISTS ix_trade_offers_token_status_created ON trade_offers (token_symbol, status, created_at DESC, id DESC);",
+            "CREATE INDEX IF NOT EXISTS ix_trade_offers_active_token_price ON trade_offers (token_symbol, price_bnb) WHERE status = 'ACTIVE';",
+        ],
+    ),
+    (
+        3,
+        "money_numeric",
+        [
+            # DOUBLE PRECISION -> NUMERIC(36, 18). float8 -> numeric keeps 15
+            # significant digits, which drops binary noise like 0.1000000000000000055.
+            # Each ALTER rewrites its table (and rebuilds its indexes) once.
+            dedent(
+                """
+                ALTER TABLE wallets
+                    ALTER COLUMN internal_slh_balance TYPE NUMERIC(36, 18) USING internal_slh_balance::numeric,
+                    ALTER COLUMN internal_slh_locked TYPE NUMERIC(36, 18) USING internal_slh_locked::numeric;
+                """
+            ),
+            dedent(
+                """
+                ALTER TABLE trade_offers
+                    ALTER COLUMN amount TYPE NUMERIC(36, 18) USING amount::numeric,
+                    ALTER COLUMN price_bnb TYPE NUMERIC(36, 18) USING price_bnb::numeric;
+                """
+            ),
+            "ALTER TABLE internal_transfers ALTER COLUMN amount TYPE NUMERIC(36, 18) USING amount::numeric;",
+            "ALTER TABLE staking_positions ALTER COLUMN amount_locked TYPE NUMERIC(36, 18) USING amount_locked::numeric;",
+            "ALTER TABLE staking_positions ALTER COLUMN annual_rate_percent TYPE NUMERIC(9, 4) USING annual_rate_percent::numeric;",
+        ],
+    ),
+    (
+        4,
+        "ledger",
+        [
+            # Transfers already in the table were applied by hand: mark them POSTED.
+            "ALTER TABLE internal_transfers ADD COLUMN IF NOT EXISTS status VARCHAR(16) NOT NULL DEFAULT 'POSTED';",
+            "ALTER TABLE internal_transfers ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(128);",
+            "ALTER TABLE internal_transfers ADD COLUMN IF NOT EXISTS settled_at TIMESTAMPTZ;",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_internal_transfers_idempotency_key ON internal_transfers (idempotency_key);",
+            "CREATE INDEX IF NOT EXISTS ix_internal_transfers_pending ON internal_transfers (id) WHERE status = 'PENDING';",
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS ledger_entries (
+                    id BIGSERIAL PRIMARY KEY,
+                    transfer_id INTEGER NOT NULL REFERENCES internal_transfers (id),
+                    telegram_id VARCHAR(64) NOT NULL,
+                    amount NUMERIC(36, 18) NOT NULL,
+                    balance_after NUMERIC(36, 18) NOT NULL,
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            "CREATE INDEX IF NOT EXISTS ix_ledger_entries_telegram_id ON ledger_entries (telegram_id, id DESC);",
+        ],
     ),
-    # trade_offers table
-    dedent(
-        """
-        CREATE TABLE IF NOT EXISTS trade_offers (
-            id SERIAL PRIMARY KEY,
-            seller_telegram_id VARCHAR(64) NOT NULL,
-            buyer_telegram_id VARCHAR(64),
-            token_symbol VARCHAR(32) NOT NULL DEFAULT 'SLH',
-            amount DOUBLE PRECISION NOT NULL,
-            price_bnb DOUBLE PRECISION NOT NULL,
-            status VARCHAR(32) NOT NULL DEFAULT 'ACTIVE',
-            created_at TIMESTAMPTZ DEFAULT NOW(),
-            updated_at TIMESTAMPTZ DEFAULT NOW()
-        );
-        """
+    (
+        5,
+        "staking_accrual",
+        [
+            # accrued_until is the per-position checkpoint: rewards up to it are paid.
+            "ALTER TABLE staking_positions ADD COLUMN IF NOT EXISTS accrued_until TIMESTAMPTZ;",
+            "ALTER TABLE staking_positions ADD COLUMN IF NOT EXISTS accrued_total NUMERIC(36, 18) NOT NULL DEFAULT 0;",
+            "CREATE INDEX IF NOT EXISTS ix_staking_positions_active ON staking_positions (id) WHERE is_active;",
+        ],
     ),
-    # internal_transfers table
-    dedent(
-        """
-        CREATE TABLE IF NOT EXISTS internal_transfers (
-            id SERIAL PRIMARY KEY,
-            from_telegram_id VARCHAR(64) NOT NULL,
-            to_telegram_id VARCHAR(64) NOT NULL,
-            amount DOUBLE PRECISION NOT NULL,
-            memo VARCHAR(255),
-            created_at TIMESTAMPTZ DEFAULT NOW()
-        );
-        """
+    (
+        6,
+        "balance_snapshots",
+        [
+            # Latest known balances per wallet, keyed like wallets for one-row lookups.
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS wallet_balance_snapshots (
+                    telegram_id VARCHAR(64) PRIMARY KEY,
+                    bnb_balance NUMERIC(36, 18),
+                    slh_balance NUMERIC(36, 18),
+                    slh_ton_balance NUMERIC(36, 18),
+                    block_number BIGINT,
+                    error VARCHAR(512),
+                    fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                """
+            ),
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+                    name VARCHAR(64) PRIMARY KEY,
+                    cursor VARCHAR(64) NOT NULL DEFAULT '',
+                    pass_started_at TIMESTAMPTZ,
+                    last_pass_started_at TIMESTAMPTZ,
+                    last_pass_completed_at TIMESTAMPTZ,
+                    passes INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+        ],
     ),
-    # staking_positions table
-    dedent(
-        """
-        CREATE TABLE IF NOT EXISTS staking_positions (
-            id SERIAL PRIMARY KEY,
-            telegram_id VARCHAR(64) NOT NULL,
-            amount_locked DOUBLE PRECISION NOT NULL,
-            annual_rate_percent DOUBLE PRECISION NOT NULL DEFAULT 120.0,
-            started_at TIMESTAMPTZ DEFAULT NOW(),
-            unlock_at TIMESTAMPTZ,
-            is_active BOOLEAN NOT NULL DEFAULT TRUE
-        );
-        """
+    (
+        7,
+        "referral_stats",
+        [
+            # A user can only ever be referred once; keep the first attribution.
+            dedent(
+                """
+                DELETE FROM referrals r
+                USING referrals first
+                WHERE r.referred_telegram_id = first.referred_telegram_id AND r.id > first.id;
+                """
+            ),
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_referrals_referred ON referrals (referred_telegram_id);",
+            # Per-referrer totals, kept current by app/referrals.py with every insert.
+            dedent(
+                """
+                CREATE TABLE IF NOT EXISTS referral_stats (
+                    referrer_telegram_id VARCHAR(64) PRIMARY KEY,
+                    referrals INTEGER NOT NULL DEFAULT 0,
+                    total_reward NUMERIC(36, 18) NOT NULL DEFAULT 0,
+                    last_referral_at TIMESTAMPTZ,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+                """
+            ),
+            "CREATE INDEX IF NOT EXISTS ix_referral_stats_referrals ON referral_stats (referrals DESC, referrer_telegram_id);",
+            "CREATE INDEX IF NOT EXISTS ix_referral_stats_reward ON referral_stats (total_reward DESC, referrer_telegram_id);",
+            dedent(
+                """
+                INSERT INTO referral_stats (referrer_telegram_id, referrals, total_reward, last_referral_at)
+                SELECT referrer_telegram_id, COUNT(*), COALESCE(SUM(reward_slh_ton), 0), MAX(created_at)
+                FROM referrals
+                GROUP BY referrer_telegram_id
+                ON CONFLICT (referrer_telegram_id) DO NOTHING;
+                """
+            ),
+        ],
+    ),
+    (
+        8,
+        "indexer_lease",
+        [
+            # Which worker owns a checkpoint's next chunk, and until when.
+            "ALTER TABLE indexer_checkpoints ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(128);",
+            "ALTER TABLE indexer_checkpoints ADD COLUMN IF NOT EXISTS lease_until TIMESTAMPTZ;",
+        ],
     ),
-    # Make sure extra columns exist in existing DBs (idempotent)
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS slh_ton_address VARCHAR(255);",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS bank_account_name VARCHAR(255);",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS bank_account_number VARCHAR(64);",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS internal_slh_balance DOUBLE PRECISION DEFAULT 0;",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS internal_slh_locked DOUBLE PRECISION DEFAULT 0;",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();",
-    "ALTER TABLE wallets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();",
-    "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS seller_telegram_id VARCHAR(64);",
-    "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS buyer_telegram_id VARCHAR(64);",
-    "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS status VARCHAR(32) DEFAULT 'ACTIVE';",
-    "ALTER TABLE trade_offers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();",
 ]
 
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Arbitrary constant shared by every worker; taken for the migrating transaction only.
+MIGRATION_LOCK_KEY = 0x534C4801
+
+_VERSION_TABLE = dedent(
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(128) NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """
+)
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied migration, or 0 for a database without a version table."""
+    if conn.execute(text("SELECT to_regclass('schema_migrations') IS NULL")).scalar():
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+
+def run_migrations(conn: Connection) -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    Startup on a current schema costs two cheap reads and takes no locks.
+    Otherwise the first worker to get the advisory lock migrates while the
+    others wait on it, then find nothing left to do. The lock is
+    transaction-scoped, so it is released by the caller's commit (and works
+    through PgBouncer in transaction mode).
+    """
+    version = current_version(conn)
+    if version >= LATEST_VERSION:
+        logger.info("DB schema is current (version %d).", version)
+        return version
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    # Whoever held the lock may have migrated while this worker waited.
+    version = current_version(conn)
+    if version >= LATEST_VERSION:
+        logger.info("DB schema is current (version %d, migrated by another worker).", version)
+        return version
+
+    # Table rewrites can outlast DB_STATEMENT_TIMEOUT_MS: lift it for the migrating
+    # transaction only, but never queue forever behind a lock held by live traffic.
+    conn.execute(text("SET LOCAL statement_timeout = 0"))
+    conn.execute(text(f"SET LOCAL lock_timeout = {int(settings.db_migration_lock_timeout_ms)}"))
+    conn.execute(text(_VERSION_TABLE))
+    applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+    for number, name, statements in MIGRATIONS:
+        if number in applied:
+            continue
+        logger.info("Applying migration %d (%s)...", number, name)
+        for ddl in statements:
+            conn.execute(text(ddl))
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": number, "name": name},
+        )
+        version = number
 
-def ensure_schema(engine: Engine) -> None:
-    logger.info("Ensuring DB schema is up-to-date...")
-    with engine.begin() as conn:
-        for ddl in DDL_STATEMENTS:
-            try:
-                conn.execute(text(ddl))
-            except Exception as e:  # noqa: BLE001
-                logger.warning("DDL failed (but continuing): %s", e)
-    logger.info("DB schema ensured.")
+    logger.info("DB schema migrated to version %d.", version)
+    return version
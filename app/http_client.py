@@ -0,0 +1,58 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from .config import settings
+
+logger = logging.getLogger("slh_wallet.http")
+
+
+class HttpClient:
+    """Long-lived aiohttp session shared by every outbound API call.
+
+    Opened in the FastAPI lifespan and closed on shutdown, so BscScan / RPC
+    lookups reuse pooled keep-alive connections instead of paying a new
+    TCP+TLS handshake per request.
+    """
+
+    def __init__(self) -> None:
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.http_pool_limit,
+            limit_per_host=settings.http_pool_limit_per_host,
+            ttl_dns_cache=settings.http_dns_cache_ttl,
+            keepalive_timeout=settings.http_keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.http_total_timeout,
+            connect=settings.http_connect_timeout,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            self._session = self._build_session()
+            logger.info(
+                "HTTP client started (limit=%s, per_host=%s)",
+                settings.http_pool_limit,
+                settings.http_pool_limit_per_host,
+            )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Lazily open the session when used outside the app lifespan (scripts, shells).
+        if self._session is None or self._session.closed:
+            self._session = self._build_session()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client closed")
+        self._session = None
+
+
+http_client = HttpClient()
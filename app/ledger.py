@@ -0,0 +1,317 @@
+import asyncio
+import datetime as dt
+import logging
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .cache import card_cache
+from .config import settings
+from .db import SessionLocal
+from .money import ZERO, quantize
+
+logger = logging.getLogger("slh_wallet.ledger")
+
+
+class LedgerError(Exception):
+    """A transfer that cannot be applied; the message is safe to show to the caller."""
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class UnknownWallet(LedgerError):
+    pass
+
+
+class IdempotencyConflict(LedgerError):
+    pass
+
+
+class Ledger:
+    """Moves internal SLH between wallets with double-entry postings.
+
+    Every applied transfer writes one debit and one credit to
+    ``ledger_entries`` together with the balance updates, in one transaction.
+    :meth:`transfer` applies a transfer immediately; :meth:`enqueue` records a
+    PENDING transfer that :meth:`settle_pending` later applies together with
+    thousands of others. Wallet rows are always locked in telegram_id order,
+    so concurrent transfers and settlement runs cannot deadlock each other.
+    """
+
+    def __init__(self, batch_size: int, settle_interval: float) -> None:
+        self.batch_size = max(1, batch_size)
+        self.settle_interval = settle_interval
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self.transfers = 0
+        self.replays = 0
+        self.failures = 0
+        self.settlements = 0
+        self.settled = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _validate(from_telegram_id: str, to_telegram_id: str, amount) -> Decimal:
+        amount = quantize(amount)
+        if amount <= 0:
+            raise LedgerError("Amount must be positive")
+        if from_telegram_id == to_telegram_id:
+            raise LedgerError("Cannot transfer to the same wallet")
+        return amount
+
+    async def _insert_transfer(
+        self,
+        db: AsyncSession,
+        status: str,
+        from_telegram_id: str,
+        to_telegram_id: str,
+        amount: Decimal,
+        memo: Optional[str],
+        idempotency_key: Optional[str],
+    ) -> Tuple[models.InternalTransfer, bool]:
+        """Insert the transfer row; returns ``(row, created)``.
+
+        With an idempotency key, a retry finds the row the first attempt
+        committed (concurrent retries wait on the unique index) and gets it
+        back instead of moving the funds twice.
+        """
+        transfer = models.InternalTransfer
+        stmt = (
+            pg_insert(transfer)
+            .values(
+                from_telegram_id=from_telegram_id,
+                to_telegram_id=to_telegram_id,
+                amount=amount,
+                memo=memo,
+                status=status,
+                idempotency_key=idempotency_key,
+            )
+            .on_conflict_do_nothing(index_elements=[transfer.idempotency_key])
+            .returning(transfer)
+        )
+        row = (await db.scalars(stmt)).one_or_none()
+        if row is not None:
+            return row, True
+
+        row = (
+            await db.scalars(select(transfer).where(transfer.idempotency_key == idempotency_key))
+        ).one()
+        if (row.from_telegram_id, row.to_telegram_id, row.amount) != (from_telegram_id, to_telegram_id, amount):
+            raise IdempotencyConflict("Idempotency key was already used for a different transfer")
+        return row, False
+
+    async def transfer(
+        self,
+        from_telegram_id: str,
+        to_telegram_id: str,
+        amount,
+        memo: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> models.InternalTransfer:
+        """Apply a transfer now. Raises a :class:`LedgerError` if it cannot be applied."""
+        amount = self._validate(from_telegram_id, to_telegram_id, amount)
+        wallet = models.Wallet
+
+        async with SessionLocal() as db:
+            row, created = await self._insert_transfer(
+                db, "POSTED", from_telegram_id, to_telegram_id, amount, memo, idempotency_key
+            )
+            if not created:
+                self.replays += 1
+                return row
+
+            balances: Dict[str, Decimal] = {}
+            for telegram_id in sorted((from_telegram_id, to_telegram_id)):
+                stmt = update(wallet).where(wallet.telegram_id == telegram_id)
+                if telegram_id == from_telegram_id:
+                    # The balance check and the debit are one atomic statement.
+                    stmt = stmt.where(wallet.internal_slh_balance >= amount).values(
+                        internal_slh_balance=wallet.internal_slh_balance - amount
+                    )
+                else:
+                    stmt = stmt.values(internal_slh_balance=wallet.internal_slh_balance + amount)
+                balance = (
+                    await db.execute(stmt.returning(wallet.internal_slh_balance))
+                ).scalar_one_or_none()
+                if balance is None:
+                    await db.rollback()
+                    self.failures += 1
+                    if telegram_id == from_telegram_id and await db.get(wallet, telegram_id):
+                        raise InsufficientFunds("Insufficient internal balance")
+                    raise UnknownWallet(f"Wallet not found: {telegram_id}")
+                balances[telegram_id] = balance
+
+            await db.execute(
+                insert(models.LedgerEntry),
+                [
+                    {
+                        "transfer_id": row.id,
+                        "telegram_id": from_telegram_id,
+                        "amount": -amount,
+                        "balance_after": balances[from_telegram_id],
+                    },
+                    {
+                        "transfer_id": row.id,
+                        "telegram_id": to_telegram_id,
+                        "amount": amount,
+                        "balance_after": balances[to_telegram_id],
+                    },
+                ],
+            )
+            row.settled_at = dt.datetime.now(dt.timezone.utc)
+            await db.commit()
+
+        self.transfers += 1
+        await card_cache.invalidate(from_telegram_id)
+        await card_cache.invalidate(to_telegram_id)
+        return row
+
+    async def enqueue(
+        self,
+        from_telegram_id: str,
+        to_telegram_id: str,
+        amount,
+        memo: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> models.InternalTransfer:
+        """Record a PENDING transfer for the next settlement run."""
+        amount = self._validate(from_telegram_id, to_telegram_id, amount)
+        async with SessionLocal() as db:
+            row, created = await self._insert_transfer(
+                db, "PENDING", from_telegram_id, to_telegram_id, amount, memo, idempotency_key
+            )
+            await db.commit()
+        if not created:
+            self.replays += 1
+        return row
+
+    async def settle_pending(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Apply up to ``limit`` PENDING transfers, oldest first, in one transaction.
+
+        Transfers are claimed with SKIP LOCKED so several settlers can run at
+        once; the wallets they touch are locked in one ordered ``SELECT ... FOR
+        UPDATE``. Balances are then applied in memory in transfer order: a
+        transfer the sender cannot cover at that point is REJECTED, the rest
+        are POSTED. One bulk UPDATE per table writes everything back.
+        """
+        transfer = models.InternalTransfer
+        wallet = models.Wallet
+        async with SessionLocal() as db:
+            pending: List[models.InternalTransfer] = (
+                await db.scalars(
+                    select(transfer)
+                    .where(transfer.status == "PENDING")
+                    .order_by(transfer.id)
+                    .limit(limit or self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not pending:
+                return {"posted": 0, "rejected": 0}
+
+            ids = sorted({t.from_telegram_id for t in pending} | {t.to_telegram_id for t in pending})
+            rows = await db.execute(
+                select(wallet.telegram_id, wallet.internal_slh_balance)
+                .where(wallet.telegram_id.in_(ids))
+                .order_by(wallet.telegram_id)
+                .with_for_update()
+            )
+            balances = {telegram_id: balance or ZERO for telegram_id, balance in rows.all()}
+
+            now = dt.datetime.now(dt.timezone.utc)
+            touched = set()
+            entries = []
+            posted = rejected = 0
+            for t in pending:
+                t.settled_at = now
+                sender = balances.get(t.from_telegram_id)
+                if sender is None or t.to_telegram_id not in balances or sender < t.amount:
+                    t.status = "REJECTED"
+                    rejected += 1
+                    continue
+                balances[t.from_telegram_id] = sender - t.amount
+                balances[t.to_telegram_id] += t.amount
+                touched.update((t.from_telegram_id, t.to_telegram_id))
+                entries.append(
+                    {
+                        "transfer_id": t.id,
+                        "telegram_id": t.from_telegram_id,
+                        "amount": -t.amount,
+                        "balance_after": balances[t.from_telegram_id],
+                    }
+                )
+                entries.append(
+                    {
+                        "transfer_id": t.id,
+                        "telegram_id": t.to_telegram_id,
+                        "amount": t.amount,
+                        "balance_after": balances[t.to_telegram_id],
+                    }
+                )
+                t.status = "POSTED"
+                posted += 1
+
+            if touched:
+                await db.execute(
+                    update(wallet),
+                    [
+                        {"telegram_id": telegram_id, "internal_slh_balance": balances[telegram_id]}
+                        for telegram_id in sorted(touched)
+                    ],
+                )
+                await db.execute(insert(models.LedgerEntry), entries)
+            await db.commit()
+
+        self.settlements += 1
+        self.settled += posted
+        self.rejected += rejected
+        for telegram_id in touched:
+            await card_cache.invalidate(telegram_id)
+        return {"posted": posted, "rejected": rejected}
+
+    def start(self) -> None:
+        if self._task is None and self.settle_interval > 0:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="ledger-settler")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                result = await self.settle_pending()
+                if result["posted"] + result["rejected"] >= self.batch_size:
+                    continue  # backlog: settle the next batch right away
+            except Exception:  # noqa: BLE001
+                logger.exception("Ledger settlement failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.settle_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "transfers": self.transfers,
+            "replays": self.replays,
+            "failures": self.failures,
+            "settlements": self.settlements,
+            "settled": self.settled,
+            "rejected": self.rejected,
+        }
+
+
+ledger = Ledger(
+    batch_size=settings.ledger_settle_batch,
+    settle_interval=settings.ledger_settle_interval,
+)
@@ -1,11 +1,9 @@
 
 import logging
-from .config import get_settings
-
-settings = get_settings()
+from .config import settings
 
 logger = logging.getLogger("slh_wallet")
-level = logging.getLevelName(settings.LOG_LEVEL.upper()) if hasattr(logging, settings.LOG_LEVEL.upper()) else logging.INFO
+level = getattr(logging, settings.log_level.upper(), logging.INFO)
 logger.setLevel(level)
 
 if not logger.handlers:
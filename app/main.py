@@ -1,18 +1,81 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .db import init_db
+from .balance_indexer import balance_indexer
+from .blockchain_service import blockchain_service
+from .cache import admin_cache, cache_backend, offers_cache, card_cache
+from .config import settings
+from .db import db_pool_stats, engine, init_db
+from .http_client import http_client
+from .ledger import ledger
+from .order_book import matching_engine
+from .qr import qr_cache
+from .rate_limit import rate_limiter
+from .staking import staking_accrual
+from .router_wallet import router as wallet_api_router
+from .routers import admin as admin_router
+from .routers import ledger as ledger_router
+from .routers import referrals as referrals_router
+from .routers import trade as trade_router
 from .routers import wallet as wallet_router
+from .telegram_bot import get_application, process_update_data, shutdown_application, update_queue
 from .telegram_bot import router as telegram_router
+from .ton_service import ton_service
+from .write_behind import write_behind
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
 )
+logger = logging.getLogger("slh_wallet.main")
 
-app = FastAPI(title="SLH Community Wallet", version="0.1.0")
+
+async def _warm_bot() -> None:
+    # Off the startup path: a Telegram outage or a bad token must not keep the
+    # web app (health checks included) from booting. Updates retry lazily.
+    try:
+        await get_application()
+    except Exception:  # noqa: BLE001
+        logger.exception("Telegram bot warm-up failed; will retry on the first update")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await matching_engine.load()
+    await http_client.start()
+    await cache_backend.start()
+    write_behind.start()
+    ledger.start()
+    staking_accrual.start()
+    balance_indexer.start()
+    warm_up = None
+    if settings.telegram_mode == "webhook":
+        # Warm the bot up front so the first update after a deploy isn't a cold start.
+        warm_up = asyncio.create_task(_warm_bot(), name="telegram-warm-up")
+        update_queue.start(process_update_data)
+    try:
+        yield
+    finally:
+        if warm_up is not None and not warm_up.done():
+            warm_up.cancel()
+        await update_queue.stop(settings.telegram_drain_timeout)
+        await shutdown_application()
+        await balance_indexer.stop()
+        await staking_accrual.stop()
+        await ledger.stop()
+        await write_behind.stop()
+        await rate_limiter.close()
+        await cache_backend.close()
+        await http_client.close()
+        await engine.dispose()
+
+
+app = FastAPI(title="SLH Community Wallet", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,15 +86,36 @@ app.add_middleware(
 )
 
 
-@app.on_event("startup")
-def on_startup():
-    init_db()
-
-
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "db_pool": db_pool_stats(),
+        "cache_backend": cache_backend.stats(),
+        "balance_cache": blockchain_service.cache.stats(),
+        "ton_cache": ton_service.stats(),
+        "card_cache": card_cache.stats(),
+        "qr_cache": qr_cache.stats(),
+        "offers_cache": offers_cache.stats(),
+        "admin_cache": admin_cache.stats(),
+        "order_books": matching_engine.stats(),
+        "telegram_queue": update_queue.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "write_behind": write_behind.stats(),
+        "ledger": ledger.stats(),
+        "staking_accrual": staking_accrual.stats(),
+        "balance_indexer": balance_indexer.stats(),
+    }
+
+
 app.include_router(wallet_router.router)
+app.include_router(wallet_api_router)
+app.include_router(trade_router.router)
+app.include_router(admin_router.router)
+app.include_router(ledger_router.router)
+app.include_router(referrals_router.router)
 app.include_router(telegram_router)
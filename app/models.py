@@ -1,7 +1,10 @@
-from sqlalchemy import String, DateTime, func
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, Numeric, String, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .db import Base
+from .money import Money
 
 
 class Wallet(Base):
@@ -13,9 +16,147 @@ class Wallet(Base):
     last_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
     bnb_address: Mapped[str | None] = mapped_column(String(64), nullable=True)
     ton_address: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    slh_address: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    slh_ton_address: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    internal_slh_balance: Mapped[Decimal] = mapped_column(Money, server_default="0")
+    internal_slh_locked: Mapped[Decimal] = mapped_column(Money, server_default="0")
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class TradeOffer(Base):
+    __tablename__ = "trade_offers"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    seller_telegram_id: Mapped[str] = mapped_column(String(64))
+    buyer_telegram_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    token_symbol: Mapped[str] = mapped_column(String(32), server_default="SLH")
+    amount: Mapped[Decimal] = mapped_column(Money)
+    price_bnb: Mapped[Decimal] = mapped_column(Money)
+    status: Mapped[str] = mapped_column(String(32), server_default="ACTIVE")
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class Referral(Base):
+    __tablename__ = "referrals"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    referrer_telegram_id: Mapped[str] = mapped_column(String(64))
+    referred_telegram_id: Mapped[str] = mapped_column(String(64), unique=True)
+    reward_slh_ton: Mapped[Decimal] = mapped_column(Money, server_default="0")
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class ReferralStats(Base):
+    """Per-referrer leaderboard row, maintained incrementally (see app/referrals.py)."""
+
+    __tablename__ = "referral_stats"
+
+    referrer_telegram_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    referrals: Mapped[int] = mapped_column(Integer, server_default="0")
+    total_reward: Mapped[Decimal] = mapped_column(Money, server_default="0")
+    last_referral_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class InternalTransfer(Base):
+    __tablename__ = "internal_transfers"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    from_telegram_id: Mapped[str] = mapped_column(String(64))
+    to_telegram_id: Mapped[str] = mapped_column(String(64))
+    amount: Mapped[Decimal] = mapped_column(Money)
+    memo: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # PENDING (queued for batch settlement) / POSTED / REJECTED
+    status: Mapped[str] = mapped_column(String(16), server_default="POSTED")
+    idempotency_key: Mapped[str | None] = mapped_column(String(128), nullable=True, unique=True)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    settled_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class LedgerEntry(Base):
+    """One side of a transfer: a debit (negative amount) or a credit."""
+
+    __tablename__ = "ledger_entries"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    transfer_id: Mapped[int] = mapped_column(ForeignKey("internal_transfers.id"))
+    telegram_id: Mapped[str] = mapped_column(String(64))
+    amount: Mapped[Decimal] = mapped_column(Money)
+    balance_after: Mapped[Decimal] = mapped_column(Money)
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class StakingPosition(Base):
+    __tablename__ = "staking_positions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    telegram_id: Mapped[str] = mapped_column(String(64))
+    amount_locked: Mapped[Decimal] = mapped_column(Money)
+    annual_rate_percent: Mapped[Decimal] = mapped_column(Numeric(9, 4), server_default="120.0")
+    started_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    unlock_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, server_default="true")
+    accrued_until: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    accrued_total: Mapped[Decimal] = mapped_column(Money, server_default="0")
+
+
+class WalletBalanceSnapshot(Base):
+    __tablename__ = "wallet_balance_snapshots"
+
+    telegram_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    bnb_balance: Mapped[Decimal | None] = mapped_column(Money, nullable=True)
+    slh_balance: Mapped[Decimal | None] = mapped_column(Money, nullable=True)
+    slh_ton_balance: Mapped[Decimal | None] = mapped_column(Money, nullable=True)
+    block_number: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    fetched_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class IndexerCheckpoint(Base):
+    __tablename__ = "indexer_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    cursor: Mapped[str] = mapped_column(String(64), server_default="")
+    pass_started_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_pass_started_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_pass_completed_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    passes: Mapped[int] = mapped_column(Integer, server_default="0")
+    lease_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_until: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     updated_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+
+class TransactionLog(Base):
+    __tablename__ = "transaction_logs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    telegram_id: Mapped[str] = mapped_column(String(64), index=True)
+    kind: Mapped[str] = mapped_column(String(32))
+    description: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
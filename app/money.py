@@ -0,0 +1,55 @@
+"""Exact money representation shared by the DB, the services and the API.
+
+Every amount is a ``Decimal`` stored as ``NUMERIC(36, 18)``: 18 fractional
+digits is one wei for BNB and for 18-decimal tokens, so on-chain base units
+convert without loss. Floats never touch an amount.
+"""
+
+from decimal import ROUND_DOWN, Context, Decimal
+from typing import Any
+
+from sqlalchemy import Numeric
+
+MONEY_PRECISION = 36
+MONEY_SCALE = 18
+QUANTUM = Decimal(1).scaleb(-MONEY_SCALE)
+ZERO = Decimal(0)
+# Room for every NUMERIC(36, 18) value; the default context only has 28 digits.
+_CONTEXT = Context(prec=MONEY_PRECISION)
+
+# Column type for every amount column.
+Money = Numeric(MONEY_PRECISION, MONEY_SCALE, asdecimal=True)
+
+
+def to_decimal(value: Any) -> Decimal:
+    """Decimal from a Decimal, int or string (floats go through ``str`` first)."""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        value = str(value)
+    return Decimal(value)
+
+
+def quantize(value: Any) -> Decimal:
+    """Round down to the storage scale, the way a NUMERIC(36, 18) column would keep it."""
+    return to_decimal(value).quantize(QUANTUM, rounding=ROUND_DOWN, context=_CONTEXT)
+
+
+def from_base_units(raw: int, decimals: int) -> Decimal:
+    """ממיר סכום ביחידות בסיס (wei) ל‑Decimal מדויק, בלי float"""
+    return quantize(Decimal(raw).scaleb(-decimals, context=_CONTEXT))
+
+
+def format_amount(value: Decimal) -> str:
+    """Plain positional notation (``"0.000000000000000123"``, never ``"1.23E-16"``)."""
+    return format(value, "f")
+
+
+def display_amount(value: Decimal) -> str:
+    """Shortest plain notation for people: ``1500``, ``0.5`` (``normalize()`` alone gives ``1.5E+3``)."""
+    return format(value.normalize(), "f")
+
+
+def to_base_units(amount: Any, decimals: int) -> int:
+    """Inverse of :func:`from_base_units`; extra fractional digits are truncated."""
+    return int(to_decimal(amount).scaleb(decimals).to_integral_value(rounding=ROUND_DOWN))
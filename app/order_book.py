@@ -0,0 +1,336 @@
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import heapq
+import logging
+from collections import deque
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.sql import func
+
+from . import models
+from .config import settings
+from .db import SessionLocal
+from .money import to_decimal as _to_decimal
+
+logger = logging.getLogger("slh_wallet.order_book")
+
+# How far back a sync re-reads offers, for inserts that committed after a
+# later-created offer was already seen. Offers already in the book are skipped.
+SYNC_OVERLAP = dt.timedelta(seconds=60)
+
+
+class UnknownToken(ValueError):
+    pass
+
+
+@dataclass
+class RestingOrder:
+    offer_id: int
+    seller_telegram_id: str
+    token_symbol: str
+    price: Decimal
+    remaining: Decimal
+    active: bool = True
+
+
+@dataclass
+class Fill:
+    offer_id: int
+    seller_telegram_id: str
+    price: Decimal
+    amount: Decimal
+
+
+class OrderBook:
+    """Resting asks for one token with price-time priority.
+
+    Price levels live in a min-heap (best ask on top) and each level is a FIFO
+    deque, so insert is O(log n), cancel is O(1) (lazy removal) and the best
+    price is an O(1) peek once empty levels have been purged.
+    """
+
+    def __init__(self, token_symbol: str) -> None:
+        self.token_symbol = token_symbol
+        self._prices: List[Decimal] = []
+        self._levels: Dict[Decimal, Deque[RestingOrder]] = {}
+        self._level_sizes: Dict[Decimal, int] = {}
+        self._orders: Dict[int, RestingOrder] = {}
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def add(self, order: RestingOrder) -> None:
+        if order.offer_id in self._orders:
+            return
+        level = self._levels.get(order.price)
+        if level is None:
+            level = self._levels[order.price] = deque()
+            self._level_sizes[order.price] = 0
+            heapq.heappush(self._prices, order.price)
+        level.append(order)
+        self._level_sizes[order.price] += 1
+        self._orders[order.offer_id] = order
+
+    def get(self, offer_id: int) -> Optional[RestingOrder]:
+        return self._orders.get(offer_id)
+
+    def cancel(self, offer_id: int) -> Optional[RestingOrder]:
+        order = self._orders.pop(offer_id, None)
+        if order is None:
+            return None
+        order.active = False
+        self._level_sizes[order.price] -= 1
+        if self._level_sizes[order.price] == 0:
+            # the stale heap entry is dropped lazily by _purge_top / plan_match
+            del self._levels[order.price]
+            del self._level_sizes[order.price]
+        return order
+
+    def _purge_top(self) -> None:
+        while self._prices and self._prices[0] not in self._levels:
+            heapq.heappop(self._prices)
+
+    def best_price(self) -> Optional[Decimal]:
+        self._purge_top()
+        return self._prices[0] if self._prices else None
+
+    def plan_match(
+        self, amount: Decimal, max_price: Decimal, exclude_seller: Optional[str] = None
+    ) -> List[Tuple[RestingOrder, Decimal]]:
+        """Walk levels from the best ask up to ``max_price`` without mutating the book."""
+        plan: List[Tuple[RestingOrder, Decimal]] = []
+        popped: List[Decimal] = []
+        seen = set()
+        try:
+            while amount > 0 and self._prices:
+                price = heapq.heappop(self._prices)
+                if price not in self._levels or price in seen:
+                    continue  # empty level or duplicate heap entry: drop it
+                popped.append(price)
+                seen.add(price)
+                if price > max_price:
+                    break
+                for order in self._levels[price]:
+                    if not order.active or order.seller_telegram_id == exclude_seller:
+                        continue
+                    take = min(order.remaining, amount)
+                    plan.append((order, take))
+                    amount -= take
+                    if amount == 0:
+                        break
+        finally:
+            for price in popped:
+                heapq.heappush(self._prices, price)
+        return plan
+
+    def apply(self, plan: List[Tuple[RestingOrder, Decimal]]) -> None:
+        for order, take in plan:
+            order.remaining -= take
+            if order.remaining <= 0:
+                self.cancel(order.offer_id)
+        for price in {order.price for order, _ in plan}:
+            level = self._levels.get(price)
+            while level and not level[0].active:
+                level.popleft()
+
+
+class MatchingEngine:
+    """Per-process order books for every tradable token, backed by ``trade_offers``.
+
+    Each worker keeps its own books. Before matching, a book pulls in the
+    ACTIVE offers other workers created since its last sync, and fills are
+    re-checked under row locks, so every worker matches against the same
+    offers.
+    """
+
+    def __init__(self, tokens=None) -> None:
+        self.tokens = frozenset(tokens if tokens is not None else settings.trade_tokens)
+        self.books: Dict[str, OrderBook] = {}
+        self._synced_at: Dict[str, dt.datetime] = {}
+        self._lock = asyncio.Lock()
+        self.matches = 0
+        self.fills = 0
+        self.stale_orders = 0
+        self.synced_orders = 0
+
+    def book(self, token_symbol: str) -> OrderBook:
+        if token_symbol not in self.tokens:
+            raise UnknownToken(f"Unknown token: {token_symbol}")
+        book = self.books.get(token_symbol)
+        if book is None:
+            book = self.books[token_symbol] = OrderBook(token_symbol)
+        return book
+
+    @staticmethod
+    def _resting_order(offer: models.TradeOffer) -> RestingOrder:
+        return RestingOrder(
+            offer_id=offer.id,
+            seller_telegram_id=offer.seller_telegram_id,
+            token_symbol=offer.token_symbol,
+            price=_to_decimal(offer.price_bnb),
+            remaining=_to_decimal(offer.amount),
+        )
+
+    def add_offer(self, offer: models.TradeOffer) -> None:
+        self.book(offer.token_symbol).add(self._resting_order(offer))
+
+    def cancel_offer(self, token_symbol: str, offer_id: int) -> None:
+        book = self.books.get(token_symbol)
+        if book is not None:
+            book.cancel(offer_id)
+
+    async def load(self) -> None:
+        """Rebuild every book from ACTIVE offers, oldest first."""
+        books: Dict[str, OrderBook] = {}
+        skipped = 0
+        async with SessionLocal() as db:
+            synced_at = await db.scalar(select(func.now()))
+            stmt = (
+                select(models.TradeOffer)
+                .where(models.TradeOffer.status == "ACTIVE")
+                .order_by(models.TradeOffer.created_at, models.TradeOffer.id)
+                .execution_options(yield_per=5000)
+            )
+            async for offer in await db.stream_scalars(stmt):
+                if offer.token_symbol not in self.tokens:
+                    skipped += 1
+                    continue
+                book = books.get(offer.token_symbol)
+                if book is None:
+                    book = books[offer.token_symbol] = OrderBook(offer.token_symbol)
+                book.add(self._resting_order(offer))
+        self.books = books
+        self._synced_at = {symbol: synced_at for symbol in self.tokens}
+        if skipped:
+            logger.warning("Ignored %d ACTIVE offers for tokens outside TRADE_TOKENS", skipped)
+        logger.info(
+            "Order books loaded: %s",
+            {symbol: len(book) for symbol, book in books.items()},
+        )
+
+    async def _sync(self, token_symbol: str) -> None:
+        """Add ACTIVE offers created since the last sync, including other workers' offers."""
+        book = self.book(token_symbol)
+        offer = models.TradeOffer
+        since = self._synced_at.get(token_symbol)
+        async with SessionLocal() as db:
+            synced_at = await db.scalar(select(func.now()))
+            stmt = select(offer).where(offer.token_symbol == token_symbol, offer.status == "ACTIVE")
+            if since is not None:
+                stmt = stmt.where(offer.created_at >= since - SYNC_OVERLAP)
+            rows = (await db.scalars(stmt.order_by(offer.created_at, offer.id))).all()
+        for row in rows:
+            if book.get(row.id) is None:
+                book.add(self._resting_order(row))
+                self.synced_orders += 1
+        self._synced_at[token_symbol] = synced_at
+
+    async def match_bid(
+        self,
+        buyer_telegram_id: str,
+        token_symbol: str,
+        amount: Decimal,
+        max_price: Decimal,
+    ) -> List[Fill]:
+        """Fill a buy order against resting asks; any unfilled remainder is dropped.
+
+        All fills of one bid are written in a single transaction. Rows are
+        locked in id order and re-checked, so an offer that another worker
+        filled or cancelled is evicted from the book and the match is retried.
+        """
+        book = self.book(token_symbol)
+        async with self._lock:
+            await self._sync(token_symbol)
+            while True:
+                plan = book.plan_match(amount, max_price, exclude_seller=buyer_telegram_id)
+                if not plan:
+                    return []
+                async with SessionLocal() as db:
+                    if not await self._write_fills(db, buyer_telegram_id, plan):
+                        await db.rollback()
+                        continue
+                    await db.commit()
+                book.apply(plan)
+                self.matches += 1
+                self.fills += len(plan)
+                return [
+                    Fill(
+                        offer_id=order.offer_id,
+                        seller_telegram_id=order.seller_telegram_id,
+                        price=order.price,
+                        amount=take,
+                    )
+                    for order, take in plan
+                ]
+
+    async def _write_fills(self, db, buyer_telegram_id: str, plan) -> bool:
+        offer = models.TradeOffer
+        ids = sorted(order.offer_id for order, _ in plan)
+        rows = (
+            await db.execute(
+                select(offer.id, offer.status, offer.amount)
+                .where(offer.id.in_(ids))
+                .order_by(offer.id)
+                .with_for_update()
+            )
+        ).all()
+        current = {row.id: row for row in rows}
+
+        stale = False
+        for order, _ in plan:
+            row = current.get(order.offer_id)
+            if row is None or row.status != "ACTIVE":
+                self.stale_orders += 1
+                self.cancel_offer(order.token_symbol, order.offer_id)
+                stale = True
+            elif _to_decimal(row.amount) != order.remaining:
+                order.remaining = _to_decimal(row.amount)
+                stale = True
+        if stale:
+            return False
+
+        for order, take in plan:
+            if take == order.remaining:
+                await db.execute(
+                    update(offer)
+                    .where(offer.id == order.offer_id)
+                    .values(status="FILLED", buyer_telegram_id=buyer_telegram_id, updated_at=func.now())
+                )
+            else:
+                await db.execute(
+                    update(offer)
+                    .where(offer.id == order.offer_id)
+                    .values(amount=order.remaining - take, updated_at=func.now())
+                )
+                await db.execute(
+                    insert(offer).values(
+                        seller_telegram_id=order.seller_telegram_id,
+                        buyer_telegram_id=buyer_telegram_id,
+                        token_symbol=order.token_symbol,
+                        amount=take,
+                        price_bnb=order.price,
+                        status="FILLED",
+                    )
+                )
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "books": {
+                symbol: {"orders": len(book), "best_ask": str(book.best_price())}
+                for symbol, book in self.books.items()
+            },
+            "matches": self.matches,
+            "fills": self.fills,
+            "stale_orders": self.stale_orders,
+            "synced_orders": self.synced_orders,
+        }
+
+
+matching_engine = MatchingEngine()
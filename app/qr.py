@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import segno
+
+from .config import settings
+
+logger = logging.getLogger("slh_wallet.qr")
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def content_hash(data: str, kind: str) -> str:
+    return hashlib.sha256(f"{kind}\0{data}".encode("utf-8")).hexdigest()
+
+
+def encode_qr(data: str, kind: str) -> bytes:
+    """Encode ``data`` as a QR image (CPU-bound; run it off the event loop)."""
+    buffer = io.BytesIO()
+    qr = segno.make(data, error="m")
+    if kind == "svg":
+        qr.save(buffer, kind="svg", scale=8, border=2, xmldecl=False)
+    else:
+        qr.save(buffer, kind="png", scale=8, border=2)
+    return buffer.getvalue()
+
+
+class QrCache:
+    """QR images memoized by content hash: in-memory LRU, optionally backed by a directory.
+
+    The same content always yields the same image, so entries never go stale
+    and the hash doubles as the ETag. Encoding runs in the default thread
+    pool, and concurrent requests for one image share a single encode.
+    """
+
+    def __init__(self, max_entries: int, directory: str = "") -> None:
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.encoded = 0
+
+    def _path(self, digest: str, kind: str) -> Optional[str]:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{kind}") if self.directory else None
+
+    def _remember(self, digest: str, image: bytes) -> None:
+        self._entries[digest] = image
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_or_encode(self, data: str, kind: str, digest: str) -> bytes:
+        path = self._path(digest, kind)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.disk_hits += 1
+                return f.read()
+        image = encode_qr(data, kind)
+        self.encoded += 1
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(image)
+            os.replace(tmp, path)
+        return image
+
+    async def get(self, data: str, kind: str) -> bytes:
+        digest = content_hash(data, kind)
+        image = self._entries.get(digest)
+        if image is not None:
+            self.hits += 1
+            self._entries.move_to_end(digest)
+            return image
+
+        future = self._inflight.get(digest)
+        if future is None:
+            future = self._inflight[digest] = asyncio.ensure_future(self._produce(data, kind, digest))
+        # shield: a cancelled request must not cancel an encode others wait on
+        return await asyncio.shield(future)
+
+    async def _produce(self, data: str, kind: str, digest: str) -> bytes:
+        try:
+            image = await asyncio.to_thread(self._load_or_encode, data, kind, digest)
+            self._remember(digest, image)
+            return image
+        finally:
+            self._inflight.pop(digest, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "encoded": self.encoded,
+        }
+
+
+qr_cache = QrCache(settings.qr_cache_entries, settings.qr_cache_dir)
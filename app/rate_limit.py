@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .config import settings
+
+logger = logging.getLogger("slh_wallet.rate_limit")
+
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """"5/60" -> (capacity=5, refill=5/60 tokens per second)."""
+    count, _, seconds = spec.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(seconds or 1)
+
+
+class MemoryBucketStore:
+    """Token buckets in this process only (bounded LRU of keys)."""
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    async def close(self) -> None:
+        pass
+
+
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return allowed
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers, updated atomically by a Lua script."""
+
+    def __init__(self, url: str, prefix: str = "slh:rl:") -> None:
+        import redis.asyncio as redis  # imported lazily: only needed when configured
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_TAKE_SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key: str, capacity: float, rate: float) -> bool:
+        return bool(await self._script(keys=[self.prefix + key], args=[capacity, rate]))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class RateLimiter:
+    """Per-user and global token buckets, configured per rule in ``RATE_LIMITS``."""
+
+    def __init__(self, store, rules: Dict[str, Dict[str, str]]) -> None:
+        self.store = store
+        self.rules = {
+            name: {scope: parse_rate(spec) for scope, spec in limits.items()}
+            for name, limits in rules.items()
+        }
+        self.allowed = 0
+        self.limited = 0
+
+    async def limit(self, rule: str, user_key: Any) -> Optional[str]:
+        """Take a token for ``rule``; returns the scope that refused (``"global"``/``"user"``) or None.
+
+        The global bucket is checked first, so a request refused globally
+        does not also spend the user's token.
+        """
+        limits = self.rules.get(rule)
+        if not limits:
+            return None
+        try:
+            refused = None
+            if "global" in limits and not await self.store.take(f"{rule}:g", *limits["global"]):
+                refused = "global"
+            elif "user" in limits and not await self.store.take(f"{rule}:u:{user_key}", *limits["user"]):
+                refused = "user"
+        except Exception as e:  # noqa: BLE001
+            # A broken limiter backend must not take the bot down with it.
+            logger.warning("Rate limiter unavailable, allowing request: %s", e)
+            return None
+        if refused:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return refused
+
+    async def allow(self, rule: str, user_key: Any) -> bool:
+        return await self.limit(rule, user_key) is None
+
+    async def should_notify(self, rule: str, user_key: Any) -> bool:
+        """True at most once per ``rule``'s user window: throttle the "slow down" replies too."""
+        limits = self.rules.get(rule, {})
+        if "user" not in limits:
+            return False
+        capacity, rate = limits["user"]
+        try:
+            return await self.store.take(f"{rule}:n:{user_key}", 1, rate / capacity)
+        except Exception:  # noqa: BLE001
+            return False
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"allowed": self.allowed, "limited": self.limited}
+
+
+def _build_store(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStore(url)
+    return MemoryBucketStore()
+
+
+rate_limiter = RateLimiter(
+    _build_store(settings.rate_limit_url or settings.cache_url),
+    settings.rate_limits,
+)
+
+
+async def enforce(rule: str, user_key: Any) -> None:
+    """Raise 429 when ``user_key`` (or everyone together) exceeds ``rule``."""
+    if not await rate_limiter.allow(rule, user_key):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": "1"},
+        )
+
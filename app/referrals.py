@@ -0,0 +1,112 @@
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .db import SessionLocal
+from .money import Money, quantize
+
+logger = logging.getLogger("slh_wallet.referrals")
+
+# Deep-link payload: t.me/<bot>?start=ref_<referrer telegram id>
+REF_PREFIX = "ref_"
+
+# Inserts the referral and bumps the referrer's stats row in one statement.
+# The referrer must have a wallet and the referred user must not have one yet
+# (existing users cannot be claimed); the unique index on
+# referred_telegram_id keeps the first attribution, so replays insert nothing
+# and leave the stats untouched.
+_RECORD = text(
+    """
+    WITH inserted AS (
+        INSERT INTO referrals (referrer_telegram_id, referred_telegram_id, reward_slh_ton)
+        SELECT :referrer, :referred, :reward
+        WHERE EXISTS (SELECT 1 FROM wallets WHERE telegram_id = :referrer)
+          AND NOT EXISTS (SELECT 1 FROM wallets WHERE telegram_id = :referred)
+        ON CONFLICT (referred_telegram_id) DO NOTHING
+        RETURNING referrer_telegram_id, reward_slh_ton, created_at
+    )
+    INSERT INTO referral_stats AS s (referrer_telegram_id, referrals, total_reward, last_referral_at)
+    SELECT referrer_telegram_id, 1, reward_slh_ton, created_at FROM inserted
+    ON CONFLICT (referrer_telegram_id) DO UPDATE
+    SET referrals = s.referrals + 1,
+        total_reward = s.total_reward + EXCLUDED.total_reward,
+        last_referral_at = GREATEST(s.last_referral_at, EXCLUDED.last_referral_at),
+        updated_at = NOW()
+    RETURNING s.referrer_telegram_id
+    """
+).bindparams(bindparam("reward", type_=Money))
+
+# Recomputes referral_stats from scratch, for writes that bypass _RECORD
+# (bulk imports). Same transaction as the write, so readers never see it empty.
+_REBUILD_STATS = [
+    text("DELETE FROM referral_stats"),
+    text(
+        """
+        INSERT INTO referral_stats (referrer_telegram_id, referrals, total_reward, last_referral_at)
+        SELECT referrer_telegram_id, COUNT(*), COALESCE(SUM(reward_slh_ton), 0), MAX(created_at)
+        FROM referrals
+        GROUP BY referrer_telegram_id
+        """
+    ),
+]
+
+LEADERBOARD_ORDER = {
+    "referrals": (models.ReferralStats.referrals.desc(), models.ReferralStats.referrer_telegram_id),
+    "rewards": (models.ReferralStats.total_reward.desc(), models.ReferralStats.referrer_telegram_id),
+}
+
+
+def parse_referrer(payload: Optional[str]) -> Optional[str]:
+    """The referrer's telegram id from a ``/start`` payload, if it is a referral link."""
+    if not payload or not payload.startswith(REF_PREFIX):
+        return None
+    referrer = payload[len(REF_PREFIX):]
+    return referrer if referrer.isdigit() else None
+
+
+async def record_referral(referrer: str, referred: str, reward: Optional[Decimal] = None) -> bool:
+    """Attribute ``referred`` to ``referrer``; returns False if nothing was recorded."""
+    if referrer == referred:
+        return False
+    reward = quantize(settings.referral_reward_slh_ton if reward is None else reward)
+    async with SessionLocal() as db:
+        recorded = (
+            await db.execute(_RECORD, {"referrer": referrer, "referred": referred, "reward": reward})
+        ).scalar_one_or_none()
+        await db.commit()
+    if recorded:
+        logger.info("Referral recorded: %s -> %s", referrer, referred)
+    return recorded is not None
+
+
+async def rebuild_stats(db: AsyncSession) -> None:
+    """Recompute every referral_stats row in the caller's transaction."""
+    for stmt in _REBUILD_STATS:
+        await db.execute(stmt)
+
+
+async def leaderboard(db: AsyncSession, by: str = "referrals", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Top referrers from the precomputed stats: an index scan of ``limit`` rows."""
+    stats = models.ReferralStats
+    rows = await db.execute(
+        select(stats, models.Wallet.username)
+        .outerjoin(models.Wallet, models.Wallet.telegram_id == stats.referrer_telegram_id)
+        .order_by(*LEADERBOARD_ORDER[by])
+        .limit(limit or settings.leaderboard_size)
+    )
+    return [
+        {
+            "rank": rank,
+            "referrer_telegram_id": row.referrer_telegram_id,
+            "username": username,
+            "referrals": row.referrals,
+            "total_reward": row.total_reward,
+            "last_referral_at": row.last_referral_at,
+        }
+        for rank, (row, username) in enumerate(rows.all(), start=1)
+    ]
@@ -1,72 +1,84 @@
 
+from decimal import Decimal
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .database import get_db
-from .models import User, Wallet, TransactionLog
-from .schemas import WalletRegisterIn, WalletOut
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import card_cache
+from .db import get_db
+from .models import Wallet, WalletBalanceSnapshot
+from .schemas import WalletBalancesOut, WalletRegisterIn, WalletOut
 from .logging_utils import log_event
+from . import wallet_repository
+from .write_behind import write_behind
 
 router = APIRouter(prefix="/api/wallet", tags=["wallet"])
 
 
 @router.post("/register", response_model=WalletOut)
-async def register_wallet(payload: WalletRegisterIn, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.telegram_id == payload.telegram_id).first()
-    if not user:
-        user = User(
-            telegram_id=payload.telegram_id,
-            username=payload.username,
-            first_name=payload.first_name,
-        )
-        db.add(user)
-        db.flush()
-
-    wallet = db.query(Wallet).filter(Wallet.user_id == user.id).first()
-    if not wallet:
-        wallet = Wallet(user_id=user.id)
-
-    wallet.bnb_address = payload.bnb_address or wallet.bnb_address
-    wallet.slh_address = payload.slh_address or wallet.slh_address
-
-    db.add(wallet)
-    db.add(
-        TransactionLog(
-            user_id=user.id,
-            kind="wallet_register",
-            description=f"Wallet register/update for telegram_id={payload.telegram_id}",
-        )
+async def register_wallet(payload: WalletRegisterIn, db: AsyncSession = Depends(get_db)):
+    wallet = await wallet_repository.upsert_wallet(
+        db,
+        payload.telegram_id,
+        username=payload.username,
+        first_name=payload.first_name,
+        last_name=payload.last_name,
+        bnb_address=payload.bnb_address,
+        slh_address=payload.slh_address,
+        slh_ton_address=payload.slh_ton_address,
     )
-    db.commit()
-    db.refresh(wallet)
+    write_behind.log_event(
+        payload.telegram_id,
+        "wallet_register",
+        f"Wallet register/update for telegram_id={payload.telegram_id}",
+    )
+    await db.commit()
 
+    await card_cache.invalidate(payload.telegram_id)
     await log_event("wallet", f"Wallet registered/updated for telegram_id={payload.telegram_id}")
-    return WalletOut(
-        telegram_id=user.telegram_id,
-        username=user.username,
-        first_name=user.first_name,
-        bnb_address=wallet.bnb_address,
-        slh_address=wallet.slh_address,
-        created_at=wallet.created_at,
-        updated_at=wallet.updated_at,
-    )
+    return WalletOut.model_validate(wallet)
 
 
 @router.get("/by-telegram/{telegram_id}", response_model=WalletOut)
-async def get_wallet_by_telegram(telegram_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    wallet = db.query(Wallet).filter(Wallet.user_id == user.id).first()
+async def get_wallet_by_telegram(telegram_id: str, db: AsyncSession = Depends(get_db)):
+    wallet = await db.get(Wallet, telegram_id)
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
 
-    return WalletOut(
-        telegram_id=user.telegram_id,
-        username=user.username,
-        first_name=user.first_name,
+    return WalletOut.model_validate(wallet)
+
+
+@router.get("/{telegram_id}/balances", response_model=WalletBalancesOut)
+async def get_wallet_balances(telegram_id: str, db: AsyncSession = Depends(get_db)):
+    """Balances from the latest indexer snapshot (one primary-key join, no chain calls)."""
+    snapshot = WalletBalanceSnapshot
+    row = (
+        await db.execute(
+            select(Wallet, snapshot)
+            .outerjoin(snapshot, snapshot.telegram_id == Wallet.telegram_id)
+            .where(Wallet.telegram_id == telegram_id)
+        )
+    ).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    wallet, snap = row
+    zero = Decimal(0)
+    internal = wallet.internal_slh_balance or zero
+    locked = wallet.internal_slh_locked or zero
+    onchain = snap.slh_balance if snap else None
+    ton = snap.slh_ton_balance if snap else None
+    return WalletBalancesOut(
         bnb_address=wallet.bnb_address,
         slh_address=wallet.slh_address,
-        created_at=wallet.created_at,
-        updated_at=wallet.updated_at,
+        slh_ton_address=wallet.slh_ton_address,
+        internal_slh_balance=internal,
+        internal_slh_locked=locked,
+        bnb_balance=snap.bnb_balance if snap else None,
+        slh_balance_onchain=onchain,
+        slh_ton_balance=ton,
+        slh_balance_total=(onchain or zero) + (ton or zero) + internal + locked,
+        block_number=snap.block_number if snap else None,
+        fetched_at=snap.fetched_at if snap else None,
+        error=snap.error if snap else None,
     )
@@ -1,15 +1,29 @@
-from typing import List
+import datetime as dt
+from typing import Dict
 
-from fastapi import APIRouter, Depends, Header, HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+import asyncpg
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, literal, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from .. import bulk
+from ..cache import admin_cache
+from ..db import SessionLocal
 from .. import models, schemas
 from ..config import settings
+from ..order_book import matching_engine
+from ..staking import staking_accrual
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
+_COUNTED_TABLES = {
+    "wallets": models.Wallet,
+    "referrals": models.Referral,
+    "trade_offers": models.TradeOffer,
+}
+
 
 def require_admin_token(x_admin_token: str = Header(..., alias="X-Admin-Token")):
     if not settings.admin_dash_token or x_admin_token != settings.admin_dash_token:
@@ -17,31 +31,132 @@ def require_admin_token(x_admin_token: str = Header(..., alias="X-Admin-Token"))
     return True
 
 
-@router.get("/summary", response_model=schemas.AdminSummary)
-def admin_summary(
-    _: bool = Depends(require_admin_token),
-    db: Session = Depends(get_db),
-):
-    total_wallets = db.query(func.count(models.Wallet.telegram_id)).scalar() or 0
-    total_referrals = db.query(func.count(models.Referral.id)).scalar() or 0
-    total_trade_offers = db.query(func.count(models.TradeOffer.id)).scalar() or 0
-    active_trade_offers = (
-        db.query(func.count(models.TradeOffer.id))
-        .filter(models.TradeOffer.status == "ACTIVE")
-        .scalar()
-        or 0
+async def _estimated_counts(db: AsyncSession) -> Dict[str, int]:
+    """Planner row estimates – O(1) regardless of table size."""
+    rows = await db.execute(
+        text("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(:names) AND relkind = 'r'"),
+        {"names": list(_COUNTED_TABLES)},
     )
+    return {name: count for name, count in rows.all() if count >= 0}
 
-    last_offers = (
-        db.query(models.TradeOffer)
-        .order_by(models.TradeOffer.created_at.desc())
-        .limit(20)
-        .all()
+
+async def _load_summary() -> dict:
+    async with SessionLocal() as db:
+        return await _compute_summary(db)
+
+
+async def _compute_summary(db: AsyncSession) -> dict:
+    threshold = settings.admin_approx_count_threshold
+    approx: Dict[str, int] = {}
+    if threshold > 0:
+        approx = {
+            name: count
+            for name, count in (await _estimated_counts(db)).items()
+            if count >= threshold
+        }
+
+    def total(name: str):
+        if name in approx:
+            return literal(approx[name])
+        model = _COUNTED_TABLES[name]
+        return select(func.count()).select_from(model).scalar_subquery()
+
+    active = (
+        select(func.count())
+        .select_from(models.TradeOffer)
+        .where(models.TradeOffer.status == "ACTIVE")
+        .scalar_subquery()
     )
+
+    def volume(column, *where):
+        return select(func.coalesce(func.sum(column), 0)).where(*where).scalar_subquery()
+
+    # All counts and totals in a single round trip.
+    counts = (
+        await db.execute(
+            select(
+                total("wallets").label("total_wallets"),
+                total("referrals").label("total_referrals"),
+                total("trade_offers").label("total_trade_offers"),
+                active.label("active_trade_offers"),
+                volume(models.Wallet.internal_slh_balance).label("total_internal_slh_balance"),
+                volume(models.Wallet.internal_slh_locked).label("total_internal_slh_locked"),
+                volume(models.TradeOffer.amount, models.TradeOffer.status == "ACTIVE").label("active_offer_volume"),
+                volume(models.InternalTransfer.amount).label("total_transfer_volume"),
+            )
+        )
+    ).one()
+
+    last_offers = (
+        await db.scalars(
+            select(models.TradeOffer)
+            .order_by(models.TradeOffer.created_at.desc(), models.TradeOffer.id.desc())
+            .limit(20)
+        )
+    ).all()
     return schemas.AdminSummary(
-        total_wallets=int(total_wallets),
-        total_referrals=int(total_referrals),
-        total_trade_offers=int(total_trade_offers),
-        active_trade_offers=int(active_trade_offers),
+        total_wallets=int(counts.total_wallets or 0),
+        total_referrals=int(counts.total_referrals or 0),
+        total_trade_offers=int(counts.total_trade_offers or 0),
+        active_trade_offers=int(counts.active_trade_offers or 0),
+        total_internal_slh_balance=counts.total_internal_slh_balance,
+        total_internal_slh_locked=counts.total_internal_slh_locked,
+        active_offer_volume=counts.active_offer_volume,
+        total_transfer_volume=counts.total_transfer_volume,
+        approximate=bool(approx),
+        generated_at=dt.datetime.now(dt.timezone.utc),
         last_offers=last_offers,
+    ).model_dump()
+
+
+@router.get("/summary", response_model=schemas.AdminSummary)
+async def admin_summary(_: bool = Depends(require_admin_token)):
+    # Dashboards poll this; one DB computation per TTL serves every poller.
+    return await admin_cache.get_or_load("summary", _load_summary)
+
+
+@router.post("/staking/accrue", response_model=schemas.StakingAccrualOut)
+async def accrue_staking(_: bool = Depends(require_admin_token)):
+    """Run staking accrual now instead of waiting for the periodic job."""
+    return await staking_accrual.accrue()
+
+
+def _check_bulk_args(table: str, fmt: str) -> None:
+    if table not in bulk.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    if fmt not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    fmt: str = Query("ndjson", alias="format"),
+    _: bool = Depends(require_admin_token),
+):
+    """Stream a whole table as NDJSON or CSV through a server-side cursor."""
+    _check_bulk_args(table, fmt)
+    return StreamingResponse(
+        bulk.export_rows(table, fmt),
+        media_type=bulk.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
     )
+
+
+@router.post("/import/{table}")
+async def import_table(
+    table: str,
+    request: Request,
+    fmt: str = Query("ndjson", alias="format"),
+    skip_existing: bool = False,
+    _: bool = Depends(require_admin_token),
+):
+    """COPY an NDJSON or CSV request body into a table; the body is streamed, not buffered."""
+    _check_bulk_args(table, fmt)
+    try:
+        rows = await bulk.import_rows(table, fmt, request.stream(), skip_existing=skip_existing)
+    except (ValueError, ArithmeticError, asyncpg.PostgresError, DBAPIError) as e:
+        raise HTTPException(status_code=400, detail=f"Import failed: {e}")
+    if table == "trade_offers":
+        await matching_engine.load()
+    return {"table": table, "rows": rows}
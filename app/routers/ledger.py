@@ -0,0 +1,74 @@
+import hmac
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import get_db
+from ..ledger import IdempotencyConflict, InsufficientFunds, LedgerError, UnknownWallet, ledger
+from .. import models, schemas
+from ..money import MONEY_PRECISION, MONEY_SCALE
+from ..config import settings
+from ..rate_limit import enforce
+from ..telegram_auth import telegram_user, verify_init_data
+from .admin import require_admin_token
+
+router = APIRouter(tags=["ledger"])
+
+
+def _ledger_http_error(e: LedgerError) -> HTTPException:
+    if isinstance(e, UnknownWallet):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, (InsufficientFunds, IdempotencyConflict)):
+        return HTTPException(status_code=409, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/api/ledger/transfer", response_model=schemas.InternalTransferOut)
+async def create_transfer(
+    sender: str = Depends(telegram_user),
+    to_telegram_id: str = Query(...),
+    amount: Decimal = Query(..., gt=0, max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    memo: Optional[str] = Query(None, max_length=255),
+    queued: bool = Query(False, description="Queue for batch settlement instead of applying now"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
+):
+    """Move internal SLH from the caller, identified by signed Telegram initData, to another wallet."""
+    # Limited after authentication, so nobody can drain someone else's bucket.
+    await enforce("route:transfer", sender)
+    apply = ledger.enqueue if queued else ledger.transfer
+    try:
+        return await apply(sender, to_telegram_id, amount, memo, idempotency_key)
+    except LedgerError as e:
+        raise _ledger_http_error(e)
+
+
+@router.get("/api/ledger/{telegram_id}/entries", response_model=List[schemas.LedgerEntryOut])
+async def list_entries(
+    telegram_id: str,
+    before: Optional[int] = Query(None, description="Keyset cursor: id of the last entry seen"),
+    limit: int = Query(50, ge=1, le=500),
+    init_data: str = Header("", alias="X-Telegram-Init-Data"),
+    x_admin_token: str = Header("", alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """A wallet's postings, for its owner (Telegram initData) or an admin."""
+    is_admin = bool(settings.admin_dash_token) and hmac.compare_digest(x_admin_token, settings.admin_dash_token)
+    if not is_admin and verify_init_data(init_data) != telegram_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    entry = models.LedgerEntry
+    stmt = select(entry).where(entry.telegram_id == telegram_id)
+    if before is not None:
+        stmt = stmt.where(entry.id < before)
+    return (await db.scalars(stmt.order_by(entry.id.desc()).limit(limit))).all()
+
+
+@router.post("/api/admin/ledger/settle", response_model=schemas.SettlementOut)
+async def settle_transfers(
+    limit: Optional[int] = Query(None, ge=1, le=100000),
+    _: bool = Depends(require_admin_token),
+):
+    return await ledger.settle_pending(limit)
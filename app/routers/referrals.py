@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import get_db
+from .. import referrals, schemas
+
+router = APIRouter(prefix="/api/referrals", tags=["referrals"])
+
+
+@router.get("/leaderboard", response_model=List[schemas.LeaderboardEntry])
+async def leaderboard(
+    by: str = Query("referrals", pattern="^(referrals|rewards)$"),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """Top referrers, read from the precomputed referral_stats table."""
+    return await referrals.leaderboard(db, by, limit)
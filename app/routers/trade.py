@@ -1,47 +1,96 @@
 
 from __future__ import annotations
 
+import datetime as dt
 import logging
-from typing import List
+from decimal import Decimal
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..cache import offers_cache
+from ..db import get_db
+from ..money import MONEY_PRECISION, MONEY_SCALE
 from .. import models, schemas
+from ..order_book import matching_engine
+from ..rate_limit import enforce
+from ..telegram_auth import telegram_user
 
 logger = logging.getLogger("slh_wallet.trade_router")
 
 router = APIRouter(tags=["trade"])
 
 
+def _check_token(token_symbol: str) -> None:
+    if token_symbol not in matching_engine.tokens:
+        raise HTTPException(status_code=400, detail=f"Unknown token: {token_symbol}")
+
+
+def _parse_cursor(after: str) -> Tuple[dt.datetime, int]:
+    try:
+        created_at, offer_id = after.rsplit(",", 1)
+        # an unencoded "+00:00" offset arrives as " 00:00"
+        return dt.datetime.fromisoformat(created_at.replace(" ", "+")), int(offer_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected <created_at>,<id>")
+
+
 @router.get("/api/trade/offers", response_model=list[schemas.TradeOfferOut])
-def list_offers(
-    db: Session = Depends(get_db),
+async def list_offers(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     status: str = Query("ACTIVE"),
+    token_symbol: Optional[str] = Query(None),
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    after: Optional[str] = Query(None, description="Keyset cursor: <created_at>,<id> of the last offer seen"),
     limit: int = Query(50, ge=1, le=200),
 ):
-    stmt = (
-        select(models.TradeOffer)
-        .where(models.TradeOffer.status == status)
-        .order_by(models.TradeOffer.created_at.desc())
-        .limit(limit)
+    cursor = _parse_cursor(after) if after else None
+
+    async def load_offers():
+        offer = models.TradeOffer
+        stmt = select(offer).where(offer.status == status)
+        if token_symbol:
+            stmt = stmt.where(offer.token_symbol == token_symbol)
+        if min_price is not None:
+            stmt = stmt.where(offer.price_bnb >= min_price)
+        if max_price is not None:
+            stmt = stmt.where(offer.price_bnb <= max_price)
+        if cursor:
+            stmt = stmt.where(tuple_(offer.created_at, offer.id) < tuple_(*cursor))
+        stmt = stmt.order_by(offer.created_at.desc(), offer.id.desc()).limit(limit)
+        return [
+            schemas.TradeOfferOut.model_validate(row).model_dump()
+            for row in (await db.scalars(stmt)).all()
+        ]
+
+    generation = await offers_cache.generation()
+    offers = await offers_cache.get_or_load(
+        (generation, status, token_symbol, min_price, max_price, after, limit),
+        load_offers,
     )
-    offers = db.scalars(stmt).all()
+
+    if len(offers) == limit:
+        last = offers[-1]
+        response.headers["X-Next-Cursor"] = f"{last['created_at'].isoformat()},{last['id']}"
     return offers
 
 
 @router.post("/api/trade/create-offer", response_model=schemas.TradeOfferOut)
-def create_offer(
-    telegram_id: str = Query(..., alias="telegram_id"),
+async def create_offer(
+    telegram_id: str = Depends(telegram_user),
     token_symbol: str = Query("SLH", alias="token_symbol"),
-    amount: float = Query(..., gt=0),
-    price_bnb: float = Query(..., gt=0),
-    db: Session = Depends(get_db),
+    amount: Decimal = Query(..., gt=0, max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    price_bnb: Decimal = Query(..., gt=0, max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    db: AsyncSession = Depends(get_db),
 ):
+    _check_token(token_symbol)
+    await enforce("route:create_offer", telegram_id)
     # Basic check – seller must have wallet
-    wallet = db.get(models.Wallet, telegram_id)
+    wallet = await db.get(models.Wallet, telegram_id)
     if not wallet:
         raise HTTPException(status_code=400, detail="Wallet not found for this telegram_id")
 
@@ -53,6 +102,71 @@ def create_offer(
         status="ACTIVE",
     )
     db.add(offer)
-    db.commit()
-    db.refresh(offer)
+    await db.commit()
+    await db.refresh(offer)
+
+    matching_engine.add_offer(offer)
+    await offers_cache.bump()
+    return offer
+
+
+@router.post("/api/trade/cancel-offer", response_model=schemas.TradeOfferOut)
+async def cancel_offer(
+    telegram_id: str = Depends(telegram_user),
+    offer_id: int = Query(...),
+    db: AsyncSession = Depends(get_db),
+):
+    offer = (
+        await db.execute(
+            update(models.TradeOffer)
+            .where(
+                models.TradeOffer.id == offer_id,
+                models.TradeOffer.seller_telegram_id == telegram_id,
+                models.TradeOffer.status == "ACTIVE",
+            )
+            .values(status="CANCELLED")
+            .returning(models.TradeOffer)
+        )
+    ).scalar_one_or_none()
+    if not offer:
+        raise HTTPException(status_code=404, detail="Active offer not found for this telegram_id")
+    await db.commit()
+
+    matching_engine.cancel_offer(offer.token_symbol, offer.id)
+    await offers_cache.bump()
     return offer
+
+
+@router.post("/api/trade/buy", response_model=schemas.TradeMatchOut)
+async def buy(
+    telegram_id: str = Depends(telegram_user),
+    token_symbol: str = Query("SLH"),
+    amount: Decimal = Query(..., gt=0, max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    max_price_bnb: Decimal = Query(..., gt=0, max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    db: AsyncSession = Depends(get_db),
+):
+    """Match a buy order against resting offers (price-time priority, fill-or-drop)."""
+    _check_token(token_symbol)
+    await enforce("route:buy", telegram_id)
+    wallet = await db.get(models.Wallet, telegram_id)
+    if not wallet:
+        raise HTTPException(status_code=400, detail="Wallet not found for this telegram_id")
+
+    fills = await matching_engine.match_bid(telegram_id, token_symbol, amount, max_price_bnb)
+    if fills:
+        await offers_cache.bump()
+
+    return schemas.TradeMatchOut(
+        token_symbol=token_symbol,
+        requested_amount=amount,
+        filled_amount=sum((fill.amount for fill in fills), Decimal(0)),
+        fills=[
+            schemas.TradeFillOut(
+                offer_id=fill.offer_id,
+                seller_telegram_id=fill.seller_telegram_id,
+                amount=fill.amount,
+                price_bnb=fill.price,
+            )
+            for fill in fills
+        ],
+    )
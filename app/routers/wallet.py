@@ -1,16 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
 
-from ..db import get_db
-from .. import models
+from ..cards import card_headers, get_card, is_not_modified, templates
 from ..config import settings
+from ..qr import CONTENT_TYPES, content_hash, qr_cache
 
 router = APIRouter(tags=["wallet"])
 
-templates = Jinja2Templates(directory="app/templates")
-
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -26,19 +24,38 @@ async def index(request: Request):
 @router.get("/u/{telegram_id}", response_class=HTMLResponse)
 async def user_card(
     telegram_id: str,
-    request: Request,
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
 ):
-    wallet = db.get(models.Wallet, telegram_id)
-    if not wallet:
+    # Shared links get fetched in bursts by link-preview crawlers: serve the
+    # cached render and let clients and CDNs revalidate with a 304.
+    card = await get_card(telegram_id)
+    if not card:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return templates.TemplateResponse(
-        "user_card.html",
-        {
-            "request": request,
-            "wallet": wallet,
-            "slh_token_address": settings.slh_token_address,
-            "base_url": settings.base_url,
-        },
-    )
+    headers = card_headers(card)
+    if is_not_modified(card, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(card["html"], headers=headers)
+
+
+@router.get("/u/{telegram_id}/qr.{kind}")
+async def user_card_qr(
+    telegram_id: str,
+    kind: Literal["png", "svg"],
+    target: Literal["card", "bnb", "ton"] = Query("card"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """QR for the card link (default) or the BNB / TON address on the card."""
+    card = await get_card(telegram_id)
+    data = card.get("qr", {}).get(target) if card else None
+    if not data:
+        raise HTTPException(status_code=404, detail="QR target not found")
+
+    # Same content, same image: the content hash is a strong validator.
+    etag = f'"{content_hash(data, kind)}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.card_max_age}"}
+    if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    image = await qr_cache.get(data, kind)
+    return Response(image, media_type=CONTENT_TYPES[kind], headers=headers)
@@ -2,9 +2,22 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Optional
+from decimal import Decimal
+from typing import Annotated, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PlainSerializer
+
+from .money import MONEY_PRECISION, MONEY_SCALE, format_amount
+
+# Exact amount as stored in NUMERIC(36, 18); serialized as a plain decimal string in JSON.
+Money = Annotated[
+    Decimal,
+    Field(max_digits=MONEY_PRECISION, decimal_places=MONEY_SCALE),
+    PlainSerializer(format_amount, return_type=str, when_used="json"),
+]
+
+# Telegram user ids are positive integers; they also end up in URLs and file paths.
+TelegramId = Annotated[str, Field(pattern=r"^[0-9]{1,20}$")]
 
 
 class WalletBase(BaseModel):
@@ -15,6 +28,7 @@ class WalletBase(BaseModel):
 
 
 class WalletRegisterIn(WalletBase):
+    telegram_id: TelegramId
     bnb_address: Optional[str] = None
     slh_address: Optional[str] = None
     slh_ton_address: Optional[str] = None
@@ -29,8 +43,8 @@ class WalletOut(WalletBase):
     bank_account_name: Optional[str] = None
     bank_account_number: Optional[str] = None
 
-    internal_slh_balance: float = 0.0
-    internal_slh_locked: float = 0.0
+    internal_slh_balance: Money = Decimal(0)
+    internal_slh_locked: Money = Decimal(0)
 
     created_at: Optional[dt.datetime] = None
     updated_at: Optional[dt.datetime] = None
@@ -44,19 +58,27 @@ class WalletBalancesOut(BaseModel):
     bnb_address: Optional[str] = None
     slh_address: Optional[str] = None
     slh_ton_address: Optional[str] = None
-    internal_slh_balance: float = 0.0
-    internal_slh_locked: float = 0.0
+    internal_slh_balance: Money = Decimal(0)
+    internal_slh_locked: Money = Decimal(0)
 
-    bnb_balance: float = 0.0
-    slh_balance_onchain: float = 0.0
-    slh_balance_total: float = 0.0
+    # On-chain balances are None until the indexer has fetched them once
+    bnb_balance: Optional[Money] = None
+    slh_balance_onchain: Optional[Money] = None
+    slh_ton_balance: Optional[Money] = None
+    # Sum of the SLH balances that are known
+    slh_balance_total: Money = Decimal(0)
+
+    # Snapshot the on-chain figures come from (None until the indexer got to it)
+    block_number: Optional[int] = None
+    fetched_at: Optional[dt.datetime] = None
+    error: Optional[str] = None
 
 
 class TradeOfferCreate(BaseModel):
     telegram_id: str
     token_symbol: str = Field(default="SLH")
-    amount: float
-    price_bnb: float
+    amount: Money = Field(gt=0)
+    price_bnb: Money = Field(gt=0)
 
 
 class TradeOfferOut(BaseModel):
@@ -64,10 +86,91 @@ class TradeOfferOut(BaseModel):
     seller_telegram_id: str
     buyer_telegram_id: Optional[str] = None
     token_symbol: str
-    amount: float
-    price_bnb: float
+    amount: Money
+    price_bnb: Money
     status: str
     created_at: dt.datetime
 
     class Config:
         from_attributes = True
+
+
+class TradeFillOut(BaseModel):
+    offer_id: int
+    seller_telegram_id: str
+    amount: Money
+    price_bnb: Money
+
+    class Config:
+        from_attributes = True
+
+
+class TradeMatchOut(BaseModel):
+    token_symbol: str
+    requested_amount: Money
+    filled_amount: Money
+    fills: List[TradeFillOut] = []
+
+
+class InternalTransferOut(BaseModel):
+    id: int
+    from_telegram_id: str
+    to_telegram_id: str
+    amount: Money
+    memo: Optional[str] = None
+    status: str
+    idempotency_key: Optional[str] = None
+    created_at: Optional[dt.datetime] = None
+    settled_at: Optional[dt.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class LedgerEntryOut(BaseModel):
+    id: int
+    transfer_id: int
+    telegram_id: str
+    amount: Money
+    balance_after: Money
+    created_at: Optional[dt.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SettlementOut(BaseModel):
+    posted: int
+    rejected: int
+
+
+class StakingAccrualOut(BaseModel):
+    positions: int
+    matured: int
+    wallets: int
+    rewarded: Money
+    skipped: bool = False
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    referrer_telegram_id: str
+    username: Optional[str] = None
+    referrals: int
+    total_reward: Money
+    last_referral_at: Optional[dt.datetime] = None
+
+
+class AdminSummary(BaseModel):
+    total_wallets: int
+    total_referrals: int
+    total_trade_offers: int
+    active_trade_offers: int
+    # Totals are summed by Postgres over NUMERIC columns, never in Python floats.
+    total_internal_slh_balance: Money = Decimal(0)
+    total_internal_slh_locked: Money = Decimal(0)
+    active_offer_volume: Money = Decimal(0)
+    total_transfer_volume: Money = Decimal(0)
+    approximate: bool = False
+    generated_at: Optional[dt.datetime] = None
+    last_offers: List[TradeOfferOut] = []
@@ -0,0 +1,249 @@
+import asyncio
+import datetime as dt
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+
+from .config import settings
+from .db import SessionLocal
+from .money import ZERO
+
+logger = logging.getLogger("slh_wallet.staking")
+
+# Only one worker accrues at a time; the others skip the run.
+ACCRUAL_LOCK_KEY = 0x534C4802
+
+# Ledger counterparty of every staking reward and principal release.
+STAKING_ACCOUNT = "system:staking"
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# One keyset page of positions with unpaid time before :now.
+_DUE = """
+    SELECT id FROM staking_positions
+    WHERE is_active AND id > :after AND COALESCE(accrued_until, started_at) < :now
+    ORDER BY id
+    LIMIT :batch
+"""
+
+_PARAMS = [bindparam("now", type_=DateTime(timezone=True))]
+
+# Wallets are locked in telegram_id order first, like the ledger does, so the
+# bulk credit below cannot deadlock with transfers or settlement runs.
+_LOCK_WALLETS = text(
+    f"""
+    SELECT telegram_id FROM wallets
+    WHERE telegram_id IN (SELECT telegram_id FROM staking_positions WHERE id IN ({_DUE}))
+    ORDER BY telegram_id
+    FOR UPDATE
+    """
+).bindparams(*_PARAMS)
+
+# Accrues a page in one statement: simple interest from each position's
+# checkpoint (accrued_until, initially started_at) up to :now or its unlock
+# time, whichever is first. Matured positions are closed and their principal
+# moves from internal_slh_locked back to internal_slh_balance, but never more
+# than the wallet actually has locked (any shortfall is reported, not minted).
+# Every credit to internal_slh_balance is posted like a ledger transfer from
+# the staking system account, one per wallet, with both ledger entries; the
+# system account's balance_after runs negative by the total paid out.
+_ACCRUE = text(
+    f"""
+    WITH due AS (
+        SELECT
+            p.id,
+            p.telegram_id,
+            p.amount_locked,
+            p.unlock_at IS NOT NULL AND p.unlock_at <= :now AS matured,
+            LEAST(:now, COALESCE(p.unlock_at, :now)) AS accrue_to,
+            trunc(
+                p.amount_locked * p.annual_rate_percent / 100
+                * GREATEST(
+                    EXTRACT(EPOCH FROM LEAST(:now, COALESCE(p.unlock_at, :now))
+                                       - COALESCE(p.accrued_until, p.started_at))::numeric,
+                    0
+                )
+                / {SECONDS_PER_YEAR},
+                18
+            ) AS reward
+        FROM staking_positions p
+        WHERE p.id IN ({_DUE})
+        FOR UPDATE
+    ),
+    positions AS (
+        UPDATE staking_positions p
+        SET accrued_until = due.accrue_to,
+            accrued_total = p.accrued_total + due.reward,
+            is_active = NOT due.matured
+        FROM due
+        WHERE p.id = due.id
+        RETURNING p.id
+    ),
+    credits AS (
+        SELECT
+            d.telegram_id,
+            SUM(d.reward) AS reward,
+            SUM(CASE WHEN d.matured THEN d.amount_locked ELSE 0 END) AS unlocked
+        FROM due d
+        GROUP BY d.telegram_id
+    ),
+    releases AS (
+        SELECT
+            c.telegram_id,
+            c.reward,
+            c.unlocked,
+            LEAST(c.unlocked, GREATEST(COALESCE(w.internal_slh_locked, 0), 0)) AS released
+        FROM credits c
+        JOIN wallets w ON w.telegram_id = c.telegram_id
+    ),
+    credited AS (
+        UPDATE wallets w
+        SET internal_slh_balance = COALESCE(w.internal_slh_balance, 0) + r.reward + r.released,
+            internal_slh_locked = COALESCE(w.internal_slh_locked, 0) - r.released,
+            updated_at = NOW()
+        FROM releases r
+        WHERE w.telegram_id = r.telegram_id
+        RETURNING w.telegram_id, w.internal_slh_balance AS balance_after, r.reward + r.released AS amount
+    ),
+    transfers AS (
+        INSERT INTO internal_transfers (from_telegram_id, to_telegram_id, amount, memo, status, settled_at)
+        SELECT :account, telegram_id, amount, 'staking accrual', 'POSTED', :now
+        FROM credited
+        WHERE amount > 0
+        ORDER BY telegram_id
+        RETURNING id, to_telegram_id, amount
+    ),
+    entries AS (
+        INSERT INTO ledger_entries (transfer_id, telegram_id, amount, balance_after)
+        SELECT
+            t.id,
+            :account,
+            -t.amount,
+            COALESCE(
+                (SELECT balance_after FROM ledger_entries
+                 WHERE telegram_id = :account ORDER BY id DESC LIMIT 1),
+                0
+            ) - SUM(t.amount) OVER (ORDER BY t.id)
+        FROM transfers t
+        UNION ALL
+        SELECT t.id, t.to_telegram_id, t.amount, c.balance_after
+        FROM transfers t
+        JOIN credited c ON c.telegram_id = t.to_telegram_id
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM positions) AS positions,
+        (SELECT MAX(id) FROM positions) AS last_id,
+        (SELECT COUNT(*) FROM due WHERE matured) AS matured,
+        (SELECT COALESCE(SUM(reward), 0) FROM due) AS rewarded,
+        (SELECT COUNT(*) FROM credited) AS wallets,
+        (SELECT COALESCE(SUM(unlocked - released), 0) FROM releases) AS shortfall,
+        (SELECT COUNT(*) FROM entries) AS entries
+    """
+).bindparams(*_PARAMS)
+
+
+class StakingAccrual:
+    """Periodic, incremental reward accrual over ``staking_positions``.
+
+    All the arithmetic happens in Postgres, a keyset page of positions per
+    transaction, so a run over millions of positions streams no rows into
+    Python. Each position's ``accrued_until`` checkpoint makes runs
+    incremental and makes a crashed or interrupted run safe to repeat.
+    """
+
+    def __init__(self, batch_size: int, interval: float) -> None:
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self.runs = 0
+        self.skipped = 0
+        self.positions = 0
+        self.matured = 0
+        self.rewarded = ZERO
+        self.last_run_at: Optional[dt.datetime] = None
+
+    async def accrue(self, now: Optional[dt.datetime] = None) -> Dict[str, Any]:
+        """Accrue every active position up to ``now`` (defaults to the current time)."""
+        now = now or dt.datetime.now(dt.timezone.utc)
+        result: Dict[str, Any] = {"positions": 0, "matured": 0, "wallets": 0, "rewarded": ZERO, "skipped": False}
+        after = 0
+        while True:
+            params = {"now": now, "after": after, "batch": self.batch_size}
+            async with SessionLocal() as db:
+                locked = await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ACCRUAL_LOCK_KEY}
+                )
+                if not locked.scalar():
+                    # Another worker is accruing; it will cover these positions.
+                    self.skipped += 1
+                    result["skipped"] = True
+                    return result
+                await db.execute(_LOCK_WALLETS, params)
+                page = (await db.execute(_ACCRUE, {**params, "account": STAKING_ACCOUNT})).one()
+                await db.commit()
+
+            if not page.positions:
+                break
+            after = page.last_id
+            result["positions"] += page.positions
+            result["matured"] += page.matured
+            result["wallets"] += page.wallets
+            result["rewarded"] += Decimal(page.rewarded)
+            if page.shortfall:
+                logger.error(
+                    "Staking positions up to id %s unlock %s SLH more than their wallets have locked; "
+                    "only the locked amount was released",
+                    page.last_id,
+                    page.shortfall,
+                )
+
+        self.runs += 1
+        self.positions += result["positions"]
+        self.matured += result["matured"]
+        self.rewarded += result["rewarded"]
+        self.last_run_at = now
+        logger.info("Staking accrual up to %s: %s", now.isoformat(), result)
+        return result
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="staking-accrual")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.accrue()
+            except Exception:  # noqa: BLE001
+                logger.exception("Staking accrual failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "positions": self.positions,
+            "matured": self.matured,
+            "rewarded": str(self.rewarded),
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+staking_accrual = StakingAccrual(
+    batch_size=settings.staking_accrual_batch,
+    interval=settings.staking_accrual_interval,
+)
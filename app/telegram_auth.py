@@ -0,0 +1,44 @@
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import Header, HTTPException
+
+from .config import settings
+
+
+def verify_init_data(init_data: str, max_age: Optional[float] = None) -> Optional[str]:
+    """Telegram id of the user who signed WebApp ``initData``, or None if it does not verify.
+
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    if not init_data or not settings.telegram_bot_token:
+        return None
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", settings.telegram_bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        return None
+
+    max_age = settings.telegram_init_data_max_age if max_age is None else max_age
+    try:
+        auth_date = int(fields.get("auth_date", "0"))
+        user_id = json.loads(fields.get("user", "{}")).get("id")
+    except (TypeError, ValueError):
+        return None
+    if max_age > 0 and time.time() - auth_date > max_age:
+        return None
+    return str(user_id) if user_id else None
+
+
+def telegram_user(init_data: str = Header("", alias="X-Telegram-Init-Data")) -> str:
+    """FastAPI dependency: the Telegram id proven by the Mini App's signed initData."""
+    telegram_id = verify_init_data(init_data)
+    if telegram_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired Telegram init data")
+    return telegram_id
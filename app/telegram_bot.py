@@ -1,26 +1,39 @@
+import asyncio
+import functools
 import json
 import logging
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request
 from telegram import Update
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
 )
-from sqlalchemy.orm import Session
 
+from .cache import card_cache
 from .config import settings
-from .db import get_db
-from . import models
+from .db import SessionLocal
+from . import referrals, wallet_repository
+from .rate_limit import rate_limiter
+from .telegram_queue import UpdateQueue
+from .write_behind import write_behind
 
 logger = logging.getLogger("slh_wallet.bot")
 
 router = APIRouter(tags=["telegram"])
 
 _application: Optional[Application] = None
+_application_lock = asyncio.Lock()
+
+update_queue = UpdateQueue(
+    workers=settings.telegram_workers,
+    max_size=settings.telegram_queue_size,
+    dedup_size=settings.telegram_dedup_size,
+)
 
 
 async def _build_application() -> Application:
@@ -31,6 +44,17 @@ async def _build_application() -> Application:
         ApplicationBuilder()
         .token(settings.telegram_bot_token)
         .concurrent_updates(True)
+        # Queue outbound sends to Telegram's global / per-group limits and
+        # retry on RetryAfter instead of failing with 429s.
+        .rate_limiter(
+            AIORateLimiter(
+                overall_max_rate=settings.telegram_send_rate,
+                overall_time_period=1,
+                group_max_rate=settings.telegram_group_send_rate,
+                group_time_period=60,
+                max_retries=settings.telegram_send_retries,
+            )
+        )
         .build()
     )
 
@@ -38,6 +62,7 @@ async def _build_application() -> Application:
     app.add_handler(CommandHandler("wallet", cmd_wallet))
     app.add_handler(CommandHandler("set_bnb", cmd_set_bnb))
     app.add_handler(CommandHandler("set_ton", cmd_set_ton))
+    app.add_handler(CommandHandler("leaderboard", cmd_leaderboard))
     app.add_handler(CommandHandler("help", cmd_help))
 
     return app
@@ -46,16 +71,53 @@ async def _build_application() -> Application:
 async def get_application() -> Application:
     global _application
     if _application is None:
-        _application = await _build_application()
-        await _application.initialize()
+        async with _application_lock:
+            if _application is None:
+                app = await _build_application()
+                await app.initialize()  # fetches getMe: the bot is warm after this
+                _application = app
     return _application
 
 
+async def shutdown_application() -> None:
+    global _application
+    if _application is not None:
+        await _application.shutdown()
+        _application = None
+
+
+def rate_limited(rule: str):
+    """Drop a command when the user (or everyone together) exceeds ``rule``."""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            user = update.effective_user
+            refused = await rate_limiter.limit(rule, user.id) if user else None
+            if refused:
+                # Replying to every throttled command would recreate the flood
+                # outbound: tell a user once per window, stay silent when global.
+                if refused == "user" and await rate_limiter.should_notify(rule, user.id):
+                    await update.effective_chat.send_message("⏳ יותר מדי בקשות – נסה שוב בעוד רגע.")
+                return
+            await handler(update, context)
+
+        return wrapper
+
+    return decorator
+
+
+@rate_limited("cmd:start")
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     if not user:
         return
 
+    # Deep link t.me/<bot>?start=ref_<telegram_id> arrives as "/start ref_<telegram_id>".
+    referrer = referrals.parse_referrer(context.args[0] if context.args else None)
+    if referrer:
+        await referrals.record_referral(referrer, str(user.id))
+
     base = settings.base_url
 
     text = (
@@ -70,6 +132,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "/wallet – יצירת כרטיס משתמש וקבלת קישור אישי\n"
         "/set_bnb <כתובת> – שמירת כתובת BNB שלך\n"
         "/set_ton <כתובת> – שמירת כתובת TON שלך\n"
+        "/leaderboard – טבלת המפנים המובילים\n"
         "/help – עזרה והסבר מלא\n\n"
         f"אזור אישי יוצג בכתובת: {base}/u/{{telegram_id}}"
     )
@@ -77,36 +140,27 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.effective_chat.send_message(text)
 
 
-async def _ensure_wallet_record(user, db: Session) -> models.Wallet:
-    wallet = db.get(models.Wallet, str(user.id))
-    if not wallet:
-        wallet = models.Wallet(
-            telegram_id=str(user.id),
-            username=user.username or "",
-            first_name=user.first_name or "",
-            last_name=user.last_name or "",
-        )
-        db.add(wallet)
-        db.commit()
-        db.refresh(wallet)
-    return wallet
-
-
+@rate_limited("cmd:wallet")
 async def cmd_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     if not user:
         return
 
-    from .db import SessionLocal
+    async with SessionLocal() as db:
+        await wallet_repository.upsert_wallet(
+            db,
+            str(user.id),
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+        )
+        await db.commit()
 
-    db = SessionLocal()
-    try:
-        wallet = await _ensure_wallet_record(user, db)
-    finally:
-        db.close()
+    await card_cache.invalidate(str(user.id))
 
     base = settings.base_url
     hub_url = f"{base}/u/{user.id}"
+    referral_link = f"https://t.me/{context.bot.username}?start={referrals.REF_PREFIX}{user.id}"
 
     text = (
         "📲 *הכרטיס הקהילתי שלך מוכן!*\n\n"
@@ -115,6 +169,7 @@ async def cmd_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         "`/set_bnb <כתובת_BNB>`\n"
         "`/set_ton <כתובת_TON>`\n\n"
         f"האזור האישי שלך באתר:\n{hub_url}\n\n"
+        f"קישור ההזמנה שלך לחברים:\n`{referral_link}`\n\n"
         "שם יוצגו כתובותיך, קישורים לחוזה SLH בביננס, ו־QR לשיתוף הכרטיס שלך.\n\n"
         "_שימו לב: העברות SLH ו‑BNB מתבצעות בארנק החיצוני שלכם (MetaMask/Tonkeeper וכד'), "
         "המערכת רק עוזרת לסנכרן ולשתף את הפרטים בקהילה._"
@@ -123,6 +178,7 @@ async def cmd_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await update.effective_chat.send_message(text, parse_mode="Markdown")
 
 
+@rate_limited("cmd:set_bnb")
 async def cmd_set_bnb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     if not user:
@@ -133,23 +189,26 @@ async def cmd_set_bnb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         return
 
     address = context.args[0].strip()
-    if not address.startswith("0x") or len(address) < 30:
+    if not wallet_repository.is_bnb_address(address):
         await update.effective_chat.send_message("הכתובת לא נראית כמו כתובת BNB תקינה.")
         return
 
-    from .db import SessionLocal
+    # Batched with other users' updates; awaiting means the row is committed.
+    await write_behind.upsert_wallet(
+        str(user.id),
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        bnb_address=address,
+    )
+    write_behind.log_event(str(user.id), "set_bnb", f"bnb_address set to {address}")
 
-    db = SessionLocal()
-    try:
-        wallet = await _ensure_wallet_record(user, db)
-        wallet.bnb_address = address
-        db.commit()
-    finally:
-        db.close()
+    await card_cache.invalidate(str(user.id))
 
     await update.effective_chat.send_message("✅ כתובת ה‑BNB שלך נשמרה בהצלחה.")
 
 
+@rate_limited("cmd:set_ton")
 async def cmd_set_ton(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     if not user:
@@ -159,21 +218,42 @@ async def cmd_set_ton(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.effective_chat.send_message("שימוש: /set_ton <כתובת_TON>")
         return
 
-    address = " ".join(context.args).strip()
+    address = context.args[0].strip()
+    if len(context.args) > 1 or not wallet_repository.is_ton_address(address):
+        await update.effective_chat.send_message("הכתובת לא נראית כמו כתובת TON תקינה.")
+        return
 
-    from .db import SessionLocal
+    # Batched with other users' updates; awaiting means the row is committed.
+    await write_behind.upsert_wallet(
+        str(user.id),
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        ton_address=address,
+    )
+    write_behind.log_event(str(user.id), "set_ton", f"ton_address set to {address}")
 
-    db = SessionLocal()
-    try:
-        wallet = await _ensure_wallet_record(user, db)
-        wallet.ton_address = address
-        db.commit()
-    finally:
-        db.close()
+    await card_cache.invalidate(str(user.id))
 
     await update.effective_chat.send_message("✅ כתובת ה‑TON שלך נשמרה בהצלחה.")
 
 
+@rate_limited("cmd:leaderboard")
+async def cmd_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async with SessionLocal() as db:
+        entries = await referrals.leaderboard(db)
+
+    if not entries:
+        await update.effective_chat.send_message("עדיין אין הפניות. שתפו את הקישור שלכם: /wallet")
+        return
+
+    lines = ["🏆 המפנים המובילים:\n"]
+    for entry in entries:
+        name = f"@{entry['username']}" if entry["username"] else entry["referrer_telegram_id"]
+        lines.append(f"{entry['rank']}. {name} – {entry['referrals']} הפניות")
+    await update.effective_chat.send_message("\n".join(lines))
+
+
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (
         "ℹ️ *מערכת הארנק הקהילתי של SLH*\n\n"
@@ -189,11 +269,23 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.effective_chat.send_message(text, parse_mode="Markdown")
 
 
+async def process_update_data(data: dict) -> None:
+    app = await get_application()
+    update = Update.de_json(data, app.bot)
+    await app.process_update(update)
+
+
 @router.post("/telegram/webhook")
-async def telegram_webhook(
-    request: Request,
-    db: Session = Depends(get_db),  # reserved for future use
-) -> dict:
+async def telegram_webhook(request: Request) -> dict:
+    if settings.telegram_mode != "webhook":
+        # Updates are consumed by the standalone runner (app/bot_runner.py).
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if settings.telegram_webhook_secret and (
+        request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.telegram_webhook_secret
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
     body = await request.body()
     if not body:
         raise HTTPException(status_code=400, detail="Empty body")
@@ -203,8 +295,12 @@ async def telegram_webhook(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
-    app = await get_application()
-    update = Update.de_json(data, app.bot)
-    await app.process_update(update)
+    if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+        raise HTTPException(status_code=400, detail="Invalid update")
+
+    # Handlers run on the queue workers; answer Telegram right away. When the
+    # queue is full a 503 makes Telegram redeliver later instead of piling up.
+    if not update_queue.submit(data):
+        raise HTTPException(status_code=503, detail="Update queue is full")
 
     return {"ok": True}
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("slh_wallet.bot.queue")
+
+_UPDATE_KINDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "callback_query",
+    "inline_query",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+def _ordering_key(data: Dict[str, Any]) -> Any:
+    """Chat id of an update (falling back to the sender, then the update id)."""
+    for kind in _UPDATE_KINDS:
+        payload = data.get(kind)
+        if not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        sender = payload.get("from")
+        if sender and "id" in sender:
+            return sender["id"]
+    return data.get("update_id")
+
+
+class UpdateQueue:
+    """Bounded queue between the webhook and update processing.
+
+    Updates are sharded by chat over ``workers`` FIFO queues, so one chat's
+    updates are handled in order while different chats run in parallel.
+    ``submit`` never blocks: a full shard is reported back to the caller so the
+    webhook can push back on Telegram instead of holding the connection open.
+    """
+
+    def __init__(self, workers: int, max_size: int, dedup_size: int) -> None:
+        self.workers = max(1, workers)
+        shard_size = max(1, max_size // self.workers)
+        self._queues: List["asyncio.Queue[tuple]"] = [
+            asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)
+        ]
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._process: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._dedup_size = dedup_size
+
+        self.received = 0
+        self.enqueued = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.handle_total = 0.0
+        self.handle_max = 0.0
+
+    def start(self, process: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        if self._tasks:
+            return
+        self._process = process
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"telegram-worker-{i}")
+            for i, queue in enumerate(self._queues)
+        ]
+        logger.info("Telegram update queue started with %d workers", self.workers)
+
+    def submit(self, data: Dict[str, Any]) -> bool:
+        """Queue an update. Returns False when the queue is full (caller should retry)."""
+        self.received += 1
+        update_id = data.get("update_id")
+        if update_id in self._seen:
+            self.duplicates += 1
+            return True
+
+        key = _ordering_key(data)
+        queue = self._queues[hash(key) % self.workers]
+        try:
+            queue.put_nowait((time.monotonic(), data))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+        self.enqueued += 1
+        self._seen[update_id] = None
+        while len(self._seen) > self._dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _worker(self, queue: "asyncio.Queue[tuple]") -> None:
+        while True:
+            enqueued_at, data = await queue.get()
+            started = time.monotonic()
+            waited = started - enqueued_at
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            try:
+                await self._process(data)
+                self.processed += 1
+            except Exception:  # noqa: BLE001
+                self.failed += 1
+                logger.exception("Failed to process update %s", data.get("update_id"))
+            finally:
+                took = time.monotonic() - started
+                self.handle_total += took
+                self.handle_max = max(self.handle_max, took)
+                queue.task_done()
+
+    async def stop(self, drain_timeout: float) -> None:
+        """Let queued updates finish (up to ``drain_timeout``), then stop the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=drain_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Telegram queue not drained after %.1fs (%d left)", drain_timeout, self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.processed + self.failed
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "received": self.received,
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_avg_ms": round(1000 * self.wait_total / done, 3) if done else 0.0,
+            "wait_max_ms": round(1000 * self.wait_max, 3),
+            "handle_avg_ms": round(1000 * self.handle_total / done, 3) if done else 0.0,
+            "handle_max_ms": round(1000 * self.handle_max, 3),
+        }
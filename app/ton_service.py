@@ -1,18 +1,117 @@
+import asyncio
 import logging
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+from .cache import Cache, cache_backend
+from .config import settings
+from .http_client import http_client
+from .money import from_base_units
 
 logger = logging.getLogger("slh_wallet.ton")
 
 
 class TonService:
-    def __init__(self) -> None:
-        # בעתיד נחבר לכאן את TON API שלך (SLHMAINNET)
-        pass
-
-    async def get_slh_ton_balance(self, address: str) -> float:
-        # כרגע החזר לוגי בלבד – עד שנחבר API אמיתי
-        if not address:
-            return 0.0
-        return 0.0
+    """SLH jetton balances on TON through the toncenter v3 HTTP API.
+
+    A jetton balance lives in a per-owner jetton wallet contract. Its address
+    is derived from (owner, jetton master) and never changes, so it is
+    resolved once per owner and remembered; later refreshes look the
+    jetton wallet up directly by address.
+    """
+
+    def __init__(self, max_wallet_addresses: int = 100000) -> None:
+        self.api_url = settings.ton_api_url.rstrip("/")
+        self.api_key = settings.ton_api_key
+        self.jetton_master = settings.slh_ton_jetton_master
+        self.cache = Cache(
+            cache_backend,
+            "ton",
+            ttl=settings.balance_cache_ttl,
+            stale_ttl=settings.balance_cache_stale_ttl,
+        )
+        self._jetton_wallets: "OrderedDict[str, str]" = OrderedDict()
+        self._max_wallet_addresses = max_wallet_addresses
+        self._decimals: Optional[int] = None
+        self._decimals_lock = asyncio.Lock()
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {"X-API-Key": self.api_key} if self.api_key else None
+        async with http_client.session.get(f"{self.api_url}{path}", params=params, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def get_jetton_decimals(self) -> int:
+        """decimals של ה‑jetton, נטען פעם אחת לכל חיי התהליך"""
+        if self._decimals is not None:
+            return self._decimals
+        async with self._decimals_lock:
+            if self._decimals is None:
+                data = await self._get("/jetton/masters", {"address": self.jetton_master, "limit": 1})
+                masters = data.get("jetton_masters") or []
+                content = (masters[0].get("jetton_content") or {}) if masters else {}
+                self._decimals = int(content.get("decimals") or settings.ton_jetton_decimals)
+                logger.info("Loaded jetton decimals for %s: %s", self.jetton_master, self._decimals)
+            return self._decimals
+
+    def _remember_jetton_wallet(self, owner: str, address: str) -> None:
+        self._jetton_wallets[owner] = address
+        self._jetton_wallets.move_to_end(owner)
+        while len(self._jetton_wallets) > self._max_wallet_addresses:
+            self._jetton_wallets.popitem(last=False)
+
+    async def _fetch_slh_ton_balance(self, address: str) -> Decimal:
+        jetton_wallet = self._jetton_wallets.get(address)
+        if jetton_wallet:
+            params = {"address": jetton_wallet, "limit": 1}
+        else:
+            params = {"owner_address": address, "jetton_address": self.jetton_master, "limit": 1}
+
+        decimals, data = await asyncio.gather(
+            self.get_jetton_decimals(),
+            self._get("/jetton/wallets", params),
+        )
+        wallets = data.get("jetton_wallets") or []
+        if not wallets:
+            # No jetton wallet until the owner first receives SLH; not cached
+            # because it will be deployed by that first transfer.
+            return Decimal(0)
+        if not jetton_wallet:
+            self._remember_jetton_wallet(address, wallets[0]["address"])
+        return from_base_units(int(wallets[0].get("balance") or 0), decimals)
+
+    async def get_slh_ton_balance(self, address: str) -> Decimal:
+        """יתרת SLH ב‑TON; שגיאות רשת עולות למעלה כדי שהקורא יחליט"""
+        if not address or not self.jetton_master:
+            return Decimal(0)
+        return await self.cache.get_or_load(
+            ("SLH", address),
+            lambda: self._fetch_slh_ton_balance(address),
+        )
+
+    async def get_slh_ton_balances_many(self, addresses: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """יתרות SLH ב‑TON לכתובות רבות, עד ``settings.ton_batch_concurrency`` במקביל.
+
+        Mirrors ``BlockchainService.get_balances_many``: keyed by address, and
+        each entry carries its own ``error`` so one failure never fails the batch.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.ton_batch_concurrency))
+
+        async def run(address: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return {"slh_ton": await self.get_slh_ton_balance(address), "error": None}
+                except Exception as e:  # noqa: BLE001
+                    logger.error("Error fetching SLH TON balance for %s: %s", address, e)
+                    return {"slh_ton": None, "error": str(e) or type(e).__name__}
+
+        unique = [address for address in dict.fromkeys(addresses) if address]
+        results = await asyncio.gather(*(run(address) for address in unique))
+        return dict(zip(unique, results))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "jetton_wallets": len(self._jetton_wallets)}
 
 
 ton_service = TonService()
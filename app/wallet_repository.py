@@ -0,0 +1,77 @@
+import re
+from typing import Any, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Columns an upsert may set; None means "keep the stored value".
+WALLET_UPSERT_COLUMNS = (
+    "username",
+    "first_name",
+    "last_name",
+    "bnb_address",
+    "ton_address",
+    "slh_address",
+    "slh_ton_address",
+)
+
+_BNB_ADDRESS = re.compile(r"0x[0-9a-fA-F]{40}")
+# User-friendly (base64url, 48 chars) or raw "<workchain>:<64 hex>" form.
+_TON_ADDRESS = re.compile(r"[A-Za-z0-9_-]{48}|-?\d{1,3}:[0-9a-fA-F]{64}")
+
+
+def is_bnb_address(address: str) -> bool:
+    return bool(_BNB_ADDRESS.fullmatch(address))
+
+
+def is_ton_address(address: str) -> bool:
+    return bool(_TON_ADDRESS.fullmatch(address))
+
+
+def check_columns(fields: Dict[str, Any]) -> None:
+    unknown = set(fields) - set(WALLET_UPSERT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown wallet columns: {sorted(unknown)}")
+
+
+def wallet_upsert_statement(rows: List[Dict[str, Any]]):
+    """Multi-row ``INSERT ... ON CONFLICT (telegram_id) DO UPDATE``.
+
+    Every row gets every column so the VALUES list is rectangular; missing
+    values are NULL and COALESCE keeps what is already stored. Rows must have
+    distinct telegram_ids (Postgres refuses to update one row twice).
+    """
+    values = [
+        {"telegram_id": row["telegram_id"], **{col: row.get(col) for col in WALLET_UPSERT_COLUMNS}}
+        for row in rows
+    ]
+    stmt = pg_insert(models.Wallet).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Wallet.telegram_id],
+        set_={
+            **{
+                col: func.coalesce(stmt.excluded[col], getattr(models.Wallet, col))
+                for col in WALLET_UPSERT_COLUMNS
+            },
+            # onupdate= is not applied to ON CONFLICT, so set it explicitly.
+            "updated_at": func.now(),
+        },
+    )
+
+
+async def upsert_wallet(db: AsyncSession, telegram_id: str, **fields: Any) -> models.Wallet:
+    """Create or update a wallet in one round trip and return the stored row.
+
+    Concurrent callers for the same telegram_id serialize on the row instead of
+    racing to a primary-key violation. The caller commits.
+    """
+    check_columns(fields)
+    stmt = (
+        wallet_upsert_statement([{"telegram_id": telegram_id, **fields}])
+        .returning(models.Wallet)
+        .execution_options(populate_existing=True)
+    )
+    return (await db.scalars(stmt)).one()
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import models
+from .config import settings
+from .db import SessionLocal
+from .wallet_repository import check_columns, wallet_upsert_statement
+
+logger = logging.getLogger("slh_wallet.write_behind")
+
+_DESCRIPTION_LENGTH = models.TransactionLog.__table__.c.description.type.length
+
+
+class WriteBehindBuffer:
+    """Collects wallet upserts and audit rows and writes them in batches.
+
+    Everything pending is flushed in one transaction as multi-row
+    ``INSERT ... ON CONFLICT`` statements, either every ``flush_interval``
+    seconds or as soon as ``max_batch`` items are waiting. Callers of
+    :meth:`upsert_wallet` can await the returned future to know their row is
+    committed (group commit); audit events are fire-and-forget.
+
+    If a batch is rejected because of its data, its rows are retried one at
+    a time so a single bad row only fails its own caller; audit rows that
+    still fail are logged and dropped.
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float) -> None:
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self._wallets: Dict[str, Dict[str, Any]] = {}
+        self._waiters: Dict[str, List["asyncio.Future[None]"]] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+        self.flushes = 0
+        self.wallet_rows = 0
+        self.event_rows = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    @property
+    def pending(self) -> int:
+        return len(self._wallets) + len(self._events)
+
+    def _notify(self) -> None:
+        self.start()
+        if self.pending >= self.max_batch:
+            self._wake.set()
+
+    def upsert_wallet(self, telegram_id: str, **fields: Any) -> "asyncio.Future[None]":
+        """Queue a wallet upsert; the future resolves once it is committed."""
+        check_columns(fields)
+
+        # Postgres cannot touch the same row twice in one ON CONFLICT statement,
+        # so updates for one telegram_id are merged while they wait.
+        row = self._wallets.setdefault(telegram_id, {"telegram_id": telegram_id})
+        row.update({key: value for key, value in fields.items() if value is not None})
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(telegram_id, []).append(waiter)
+        self._notify()
+        return waiter
+
+    def log_event(self, telegram_id: str, kind: str, description: str) -> None:
+        if description and len(description) > _DESCRIPTION_LENGTH:
+            description = description[: _DESCRIPTION_LENGTH - 1] + "…"
+        self._events.append({"telegram_id": telegram_id, "kind": kind, "description": description})
+        self._notify()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("Write-behind flush failed")
+
+    async def _write(self, wallets: List[Dict[str, Any]], events: List[Dict[str, Any]]) -> None:
+        async with SessionLocal() as db:
+            for i in range(0, len(wallets), self.max_batch):
+                await db.execute(wallet_upsert_statement(wallets[i:i + self.max_batch]))
+            for i in range(0, len(events), self.max_batch):
+                await db.execute(insert(models.TransactionLog), events[i:i + self.max_batch])
+            await db.commit()
+
+    async def _write_each(
+        self, wallets: List[Dict[str, Any]], events: List[Dict[str, Any]]
+    ) -> Dict[str, Exception]:
+        """Retry a rejected batch row by row; returns the wallet rows that still fail."""
+        failed: Dict[str, Exception] = {}
+        for row in wallets:
+            try:
+                await self._write([row], [])
+            except Exception as e:  # noqa: BLE001
+                failed[row["telegram_id"]] = e
+        for event in events:
+            try:
+                await self._write([], [event])
+            except Exception as e:  # noqa: BLE001
+                self.dropped += 1
+                logger.error("Dropping audit row %r: %s", event, e)
+        return failed
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            self.start()
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            wallets, self._wallets = list(self._wallets.values()), {}
+            waiters, self._waiters = self._waiters, {}
+            events, self._events = self._events, []
+
+            failed: Dict[str, Exception] = {}
+            dropped = self.dropped
+            try:
+                await self._write(wallets, events)
+            except (DataError, IntegrityError) as e:
+                # A bad row must not stall everyone else's writes.
+                self.errors += 1
+                logger.warning(
+                    "Write-behind batch rejected (%s); retrying %d rows one by one", e, len(wallets) + len(events)
+                )
+                failed = await self._write_each(wallets, events)
+                wallets = [row for row in wallets if row["telegram_id"] not in failed]
+            except Exception as e:
+                self.errors += 1
+                # Database unavailable: audit rows wait for the next flush; wallet callers get the error.
+                self._events[:0] = events
+                for futures in waiters.values():
+                    for waiter in futures:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                raise
+
+            self.flushes += 1
+            self.wallet_rows += len(wallets)
+            self.event_rows += len(events) - (self.dropped - dropped)
+            for telegram_id, futures in waiters.items():
+                error = failed.get(telegram_id)
+                for waiter in futures:
+                    if waiter.done():
+                        continue
+                    if error is not None:
+                        waiter.set_exception(error)
+                    else:
+                        waiter.set_result(None)
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write out whatever is still pending."""
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        if self.pending:
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "wallet_rows": self.wallet_rows,
+            "event_rows": self.event_rows,
+            "errors": self.errors,
+            "dropped": self.dropped,
+        }
+
+
+write_behind = WriteBehindBuffer(
+    max_batch=settings.write_behind_max_batch,
+    flush_interval=settings.write_behind_flush_interval,
+)
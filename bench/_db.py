@@ -0,0 +1,55 @@
+"""Seeding and cleanup for the database benchmarks.
+
+Every row they create belongs to a wallet whose telegram_id starts with
+``PREFIX`` and :func:`cleanup` removes exactly those. The jobs under test
+still act on the whole database (accrual pays every active position,
+settlement applies every pending transfer), so point ``DATABASE_URL`` at a
+disposable database.
+"""
+
+from sqlalchemy import text
+
+from app.db import SessionLocal, init_db
+
+PREFIX = "bench:"
+
+_CLEANUP = [
+    """
+    DELETE FROM ledger_entries WHERE transfer_id IN (
+        SELECT id FROM internal_transfers
+        WHERE from_telegram_id LIKE :prefix OR to_telegram_id LIKE :prefix
+    )
+    """,
+    "DELETE FROM internal_transfers WHERE from_telegram_id LIKE :prefix OR to_telegram_id LIKE :prefix",
+    "DELETE FROM staking_positions WHERE telegram_id LIKE :prefix",
+    "DELETE FROM wallets WHERE telegram_id LIKE :prefix",
+]
+
+
+def telegram_id(n: int) -> str:
+    return f"{PREFIX}{n}"
+
+
+async def cleanup() -> None:
+    async with SessionLocal() as db:
+        for stmt in _CLEANUP:
+            await db.execute(text(stmt), {"prefix": PREFIX + "%"})
+        await db.commit()
+
+
+async def seed_wallets(count: int, balance: str = "0", locked: str = "0") -> None:
+    """Create ``count`` benchmark wallets, dropping any left over from an earlier run."""
+    await init_db()
+    await cleanup()
+    async with SessionLocal() as db:
+        await db.execute(
+            text(
+                """
+                INSERT INTO wallets (telegram_id, internal_slh_balance, internal_slh_locked)
+                SELECT :prefix || n, CAST(:balance AS NUMERIC), CAST(:locked AS NUMERIC)
+                FROM generate_series(0, :count - 1) AS n
+                """
+            ),
+            {"prefix": PREFIX, "count": count, "balance": balance, "locked": locked},
+        )
+        await db.commit()
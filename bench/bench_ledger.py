@@ -0,0 +1,99 @@
+"""Internal transfer throughput with hot accounts.
+
+    DATABASE_URL=postgresql://... python -m bench.bench_ledger --transfers 20000 --hot 2
+
+Needs a disposable Postgres database (migrations are applied).
+``--wallets`` senders pay into ``--hot`` receivers, the contended case for
+row locks. The same workload runs twice:
+
+* immediate: ``Ledger.transfer`` per request, ``--concurrency`` at a time;
+* batched: ``Ledger.enqueue`` per request, then ``settle_pending`` runs of
+  ``--batch`` transfers until the queue is empty.
+
+Only rows of ``bench:*`` wallets are written, and they are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from . import _env  # noqa: F401
+from . import _db
+from app.ledger import Ledger
+
+
+def _workload(transfers: int, wallets: int, hot: int, rng: random.Random):
+    for _ in range(transfers):
+        receiver = rng.randrange(hot)
+        sender = rng.randrange(hot, wallets)
+        yield _db.telegram_id(sender), _db.telegram_id(receiver), "0.000001"
+
+
+async def _immediate(ledger: Ledger, workload, concurrency: int) -> float:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(sender, receiver, amount):
+        async with limit:
+            await ledger.transfer(sender, receiver, amount)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*t) for t in workload))
+    return time.perf_counter() - started
+
+
+async def _batched(ledger: Ledger, workload, concurrency: int):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(sender, receiver, amount):
+        async with limit:
+            await ledger.enqueue(sender, receiver, amount)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*t) for t in workload))
+    enqueued = time.perf_counter()
+    posted = 0
+    while True:
+        result = await ledger.settle_pending()
+        if not result["posted"] and not result["rejected"]:
+            break
+        posted += result["posted"]
+    return enqueued - started, time.perf_counter() - enqueued, posted
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    workload = list(_workload(args.transfers, args.wallets, args.hot, rng))
+    ledger = Ledger(batch_size=args.batch, settle_interval=0)
+    n = len(workload)
+    try:
+        await _db.seed_wallets(args.wallets, balance="1000000")
+        elapsed = await _immediate(ledger, workload, args.concurrency)
+        print(f"immediate: {n:,} transfers in {elapsed:.2f}s = {n / elapsed:,.0f}/s")
+
+        await _db.seed_wallets(args.wallets, balance="1000000")
+        enqueue, settle, posted = await _batched(ledger, workload, args.concurrency)
+        print(
+            f"batched:   {n:,} enqueued in {enqueue:.2f}s, {posted:,} settled in {settle:.2f}s "
+            f"= {posted / settle:,.0f}/s settling, {n / (enqueue + settle):,.0f}/s end to end"
+        )
+    finally:
+        await _db.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_ledger")
+    parser.add_argument("--transfers", type=int, default=20_000)
+    parser.add_argument("--wallets", type=int, default=1_000)
+    parser.add_argument("--hot", type=int, default=2, help="Receiving accounts every transfer pays into")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=5_000, help="Transfers per settlement run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not 0 < args.hot < args.wallets:
+        parser.error("--hot must be between 1 and --wallets - 1")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
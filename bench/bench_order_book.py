@@ -0,0 +1,66 @@
+"""Matching throughput of the in-memory order book.
+
+    python -m bench.bench_order_book --orders 100000 --bids 20000
+
+Measures ``OrderBook`` alone: insert, cancel and bid matching
+(``plan_match`` + ``apply``) against ``--orders`` resting asks. The DB write
+of each fill batch (``MatchingEngine._write_fills``) is not included.
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from . import _env  # noqa: F401
+from app.order_book import OrderBook, RestingOrder
+
+
+def _orders(count: int, levels: int, rng: random.Random):
+    for offer_id in range(1, count + 1):
+        price = Decimal(1000 + rng.randrange(levels)).scaleb(-6)
+        amount = Decimal(rng.randrange(1, 1000))
+        yield RestingOrder(offer_id, f"seller{offer_id % 5000}", "SLH", price, amount)
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:,.0f}/s ({seconds * 1e6 / count:.2f} µs each)"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_order_book")
+    parser.add_argument("--orders", type=int, default=100_000, help="Resting asks")
+    parser.add_argument("--levels", type=int, default=2_000, help="Distinct price levels")
+    parser.add_argument("--bids", type=int, default=20_000, help="Bids to match")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    book = OrderBook("SLH")
+    orders = list(_orders(args.orders, args.levels, rng))
+    started = time.perf_counter()
+    for order in orders:
+        book.add(order)
+    print(f"insert  {args.orders:>9,} orders: {_rate(args.orders, time.perf_counter() - started)}")
+
+    victims = rng.sample(orders, min(len(orders) // 10, 10_000))
+    started = time.perf_counter()
+    for order in victims:
+        book.cancel(order.offer_id)
+    print(f"cancel  {len(victims):>9,} orders: {_rate(len(victims), time.perf_counter() - started)}")
+
+    # Bids cross a few orders each, so the book stays deep for the whole run.
+    max_price = Decimal(1000 + args.levels).scaleb(-6)
+    fills = 0
+    started = time.perf_counter()
+    for i in range(args.bids):
+        plan = book.plan_match(Decimal(rng.randrange(1, 2000)), max_price, exclude_seller=f"buyer{i}")
+        book.apply(plan)
+        fills += len(plan)
+    elapsed = time.perf_counter() - started
+    print(f"match   {args.bids:>9,} bids:   {_rate(args.bids, elapsed)}, {fills:,} fills")
+    print(f"resting after run: {len(book):,} orders, best ask {book.best_price()}")
+
+
+if __name__ == "__main__":
+    main()
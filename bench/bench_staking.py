@@ -0,0 +1,73 @@
+"""Staking accrual over a large number of positions.
+
+    DATABASE_URL=postgresql://... python -m bench.bench_staking --positions 1000000
+
+Needs a disposable Postgres database (migrations are applied). Seeds
+``--positions`` active positions spread over ``--wallets`` wallets, then runs
+``StakingAccrual.accrue`` once per ``--batch`` value, each run an hour after
+the previous one so every run accrues every position. ``--batch 1`` is the
+one-position-per-transaction baseline; keep ``--positions`` small for it.
+
+Only rows of ``bench:*`` wallets are written, and they are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import time
+
+from sqlalchemy import text
+
+from . import _env  # noqa: F401
+from . import _db
+from app.db import SessionLocal
+from app.staking import StakingAccrual
+
+
+async def _seed_positions(positions: int, wallets: int, started_at: dt.datetime) -> None:
+    async with SessionLocal() as db:
+        await db.execute(
+            text(
+                """
+                INSERT INTO staking_positions (telegram_id, amount_locked, annual_rate_percent, started_at, unlock_at)
+                SELECT :prefix || (n % :wallets), 100, 12, :started_at, NULL
+                FROM generate_series(0, :positions - 1) AS n
+                """
+            ),
+            {"prefix": _db.PREFIX, "wallets": wallets, "positions": positions, "started_at": started_at},
+        )
+        await db.commit()
+
+
+async def run(args) -> None:
+    now = dt.datetime.now(dt.timezone.utc)
+    try:
+        await _db.seed_wallets(args.wallets)
+        await _seed_positions(args.positions, args.wallets, now - dt.timedelta(days=1))
+        for i, batch in enumerate(args.batch):
+            accrual = StakingAccrual(batch_size=batch, interval=0)
+            started = time.perf_counter()
+            result = await accrual.accrue(now + dt.timedelta(hours=i))
+            elapsed = time.perf_counter() - started
+            print(
+                f"batch {batch:>7,}: {result['positions']:,} positions in {elapsed:.2f}s "
+                f"= {result['positions'] / elapsed:,.0f}/s, {result['wallets']:,} wallet credits"
+            )
+    finally:
+        await _db.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_staking")
+    parser.add_argument("--positions", type=int, default=1_000_000)
+    parser.add_argument("--wallets", type=int, default=100_000)
+    parser.add_argument(
+        "--batch", type=int, action="append", help="Positions per transaction; repeat to compare (default 10000)"
+    )
+    args = parser.parse_args()
+    args.batch = args.batch or [10_000]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 -- sql/schema_full.sql
+-- Superseded by the versioned migrations in app/db_schema.py (applied on startup);
+-- kept for reference and manual setups.
 -- Full DDL schema for SLH_Wallet community exchange
 
 CREATE TABLE IF NOT EXISTS wallets (
@@ -1,4 +1,6 @@
 -- sql/schema_patch.sql
+-- Superseded by the versioned migrations in app/db_schema.py (applied on startup);
+-- kept for reference and manual setups.
 -- Non-destructive schema patch to align an existing database with the current models.
 -- Safe to run multiple times.
 
@@ -0,0 +1,17 @@
+import datetime as dt
+from decimal import Decimal
+
+from app.bulk import _csv_value
+
+
+def test_csv_amounts_are_positional():
+    assert _csv_value(Decimal("0E-18")) == "0.000000000000000000"
+    assert _csv_value(Decimal("1.5E+3")) == "1500"
+    assert _csv_value(Decimal("1500.000000000000000000")) == "1500.000000000000000000"
+
+
+def test_csv_other_values():
+    moment = dt.datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt.timezone.utc)
+    assert _csv_value(moment) == "2024-01-02T03:04:05+00:00"
+    assert _csv_value("42") == "42"
+    assert _csv_value(None) is None
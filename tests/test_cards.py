@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+from app.cards import _card_template
+from app.money import display_amount
+
+
+def _render(**wallet):
+    data = {
+        "telegram_id": "42",
+        "bnb_address": "0x" + "a" * 40,
+        "ton_address": "EQ" + "b" * 46,
+        **wallet,
+    }
+    return _card_template.render(wallet=data, slh_token_address="0xtoken", base_url="https://example.org")
+
+
+def test_display_amount_is_positional():
+    assert display_amount(Decimal("1500.000000000000000000")) == "1500"
+    assert display_amount(Decimal("100")) == "100"
+    assert display_amount(Decimal("0E-18")) == "0"
+    assert display_amount(Decimal("1.23E-16")) == "0.000000000000000123"
+
+
+def test_card_renders_round_balances_without_exponent():
+    html = _render(
+        slh_balance=Decimal("1500.000000000000000000"),
+        slh_ton_balance=Decimal("100.000000000000000000"),
+    )
+    assert ">1500</span>" in html
+    assert ">100</span>" in html
+    assert "E+" not in html
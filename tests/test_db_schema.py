@@ -0,0 +1,76 @@
+from app import db_schema
+from app.db_schema import LATEST_VERSION, MIGRATIONS, run_migrations
+
+
+class FakeResult:
+    def __init__(self, value=None, values=()):
+        self.value = value
+        self.values = values
+
+    def scalar(self):
+        return self.value
+
+    def scalars(self):
+        return iter(self.values)
+
+
+class FakeConnection:
+    """Answers the version queries of run_migrations from an in-memory applied set.
+
+    ``on_lock`` runs when the advisory lock is taken, standing in for a
+    worker that held the lock and migrated in the meantime.
+    """
+
+    def __init__(self, applied=(), on_lock=None):
+        self.applied = set(applied)
+        self.on_lock = on_lock
+        self.ddl = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "to_regclass" in sql:
+            return FakeResult(False)
+        if "MAX(version)" in sql:
+            return FakeResult(max(self.applied, default=0))
+        if "SELECT version FROM schema_migrations" in sql:
+            return FakeResult(values=sorted(self.applied))
+        if "pg_advisory_xact_lock" in sql:
+            if self.on_lock:
+                self.on_lock(self)
+            return FakeResult()
+        if "INSERT INTO schema_migrations" in sql:
+            self.applied.add(params["version"])
+        elif not sql.startswith("SET LOCAL") and sql != db_schema._VERSION_TABLE:
+            self.ddl.append(sql)
+        return FakeResult()
+
+
+def _migrate_everything(conn):
+    conn.applied.update(number for number, _, _ in MIGRATIONS)
+
+
+def _no_lock(conn):
+    raise AssertionError("advisory lock taken on a current schema")
+
+
+def test_current_schema_takes_no_lock():
+    conn = FakeConnection(on_lock=_no_lock)
+    _migrate_everything(conn)
+
+    assert run_migrations(conn) == LATEST_VERSION
+    assert conn.ddl == []
+
+
+def test_rereads_version_after_waiting_for_the_lock():
+    conn = FakeConnection(applied=[1], on_lock=_migrate_everything)
+
+    assert run_migrations(conn) == LATEST_VERSION
+    assert conn.ddl == []
+
+
+def test_applies_only_missing_migrations():
+    conn = FakeConnection(applied=[1, 2])
+
+    assert run_migrations(conn) == LATEST_VERSION
+    expected = [ddl for number, _, statements in MIGRATIONS if number > 2 for ddl in statements]
+    assert conn.ddl == expected
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import DataError
+
+from app import write_behind as wb
+
+
+class FakeSession:
+    """Stands in for SessionLocal(): records each statement and commit."""
+
+    def __init__(self, db: "FakeDatabase") -> None:
+        self.db = db
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if isinstance(statement, list) and any(row["telegram_id"] in self.db.bad_ids for row in statement):
+            raise DataError("INSERT", {}, Exception("value too long"))
+        self.statements.append(statement)
+
+    async def commit(self):
+        if self.db.down:
+            raise ConnectionError("database unavailable")
+        self.db.commits.append(self.statements)
+
+
+class FakeDatabase:
+    def __init__(self) -> None:
+        self.commits = []
+        self.bad_ids = set()
+        self.down = False
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(wb, "SessionLocal", db)
+    # The real statement needs a dialect to compile; the rows are what matters here.
+    monkeypatch.setattr(wb, "wallet_upsert_statement", list)
+    return db
+
+
+async def _write_concurrently(buffer, telegram_ids):
+    async def writer(telegram_id):
+        await buffer.upsert_wallet(telegram_id, username=f"user{telegram_id}")
+
+    try:
+        # A waiter that is never resolved fails the test instead of hanging it.
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(writer(telegram_id) for telegram_id in telegram_ids),
+                buffer.flush(),
+                return_exceptions=True,
+            ),
+            timeout=5,
+        )
+    finally:
+        await buffer.stop()
+
+
+def test_concurrent_writers_share_one_commit(database):
+    buffer = wb.WriteBehindBuffer(max_batch=100, flush_interval=60)
+    ids = [str(n) for n in range(20)] + ["7", "7"]
+
+    results = asyncio.run(_write_concurrently(buffer, ids))
+
+    assert results == [None] * (len(ids) + 1)
+    assert len(database.commits) == 1
+    (statements,) = database.commits
+    assert len(statements) == 1
+    assert sorted(row["telegram_id"] for row in statements[0]) == sorted(set(ids))
+    assert buffer.stats()["flushes"] == 1
+    assert buffer.stats()["wallet_rows"] == 20
+
+
+def test_failed_commit_reaches_every_waiter(database):
+    database.down = True
+    buffer = wb.WriteBehindBuffer(max_batch=100, flush_interval=60)
+    ids = [str(n) for n in range(10)] + ["3"]
+
+    results = asyncio.run(_write_concurrently(buffer, ids))
+
+    assert len(results) == len(ids) + 1
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert database.commits == []
+    assert buffer.stats()["errors"] == 1
+
+
+def test_bad_row_fails_only_its_own_writer(database):
+    database.bad_ids.add("5")
+    buffer = wb.WriteBehindBuffer(max_batch=100, flush_interval=60)
+    ids = [str(n) for n in range(10)]
+
+    *writers, flushed = asyncio.run(_write_concurrently(buffer, ids))
+
+    assert flushed is None
+    assert isinstance(writers[5], DataError)
+    assert [result for i, result in enumerate(writers) if i != 5] == [None] * 9
+    assert sorted(statements[0][0]["telegram_id"] for statements in database.commits) == sorted(
+        set(ids) - {"5"}
+    )